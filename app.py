@@ -23,14 +23,15 @@ from models import db, Camera, Detection, StreamSession, DetectionSchedule
 from cache import cache_manager, CameraCache, StreamCache, DetectionCache
 from services import (
     CameraService, StreamService, DetectionService, 
-    async_face_detection_service, AsyncFaceDetectionService
+    async_face_detection_service, AsyncFaceDetectionService,
+    get_thread_face_cascade, HAAR_DETECT_KWARGS
 )
 
 # Import logging và middleware
 from logger_config import setup_logging, request_logger, security_logger, performance_logger
 from middleware import (
     RequestLoggingMiddleware, CompressionMiddleware, RateLimitMiddleware,
-    CacheControlMiddleware, SecurityHeadersMiddleware,
+    CacheControlMiddleware, SecurityHeadersMiddleware, CombinedResponseMiddleware, OrjsonProvider,
     require_json, validate_pagination, log_api_call,
     create_paginated_response, create_api_response
 )
@@ -40,10 +41,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Load configuration
 config_name = os.environ.get('FLASK_CONFIG', 'default')
 app.config.from_object(config[config_name])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config[config_name].engine_options()
 
 # Setup comprehensive logging system
 logger = setup_logging(app)
@@ -57,16 +60,21 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=[app.config['RATELIMIT_DEFAULT']],
-    storage_uri=app.config['RATELIMIT_STORAGE_URL']
+    storage_uri=app.config['RATELIMIT_STORAGE_URL'],
+    strategy=app.config['RATELIMIT_STRATEGY']
 )
 limiter.init_app(app)
 
 # Initialize middleware
-request_logging = RequestLoggingMiddleware(app)
-compression = CompressionMiddleware(app, min_size=1024)
+request_logging = RequestLoggingMiddleware()
+compression = CompressionMiddleware(min_size=2048)
+cache_control = CacheControlMiddleware()
+security_headers = SecurityHeadersMiddleware()
+# Một after_request duy nhất cho logging/compression/cache/security headers
+response_middleware = CombinedResponseMiddleware(
+    app, request_logging, compression, cache_control, security_headers
+)
 rate_limit_middleware = RateLimitMiddleware(app)
-cache_control = CacheControlMiddleware(app)
-security_headers = SecurityHeadersMiddleware(app)
 
 # Thư mục lưu trữ ảnh khi phát hiện khuôn mặt
 UPLOAD_FOLDER = app.config['DETECTION_FOLDER']
@@ -77,7 +85,6 @@ cameras = {}
 active_streams = set()
 face_detection_schedule = {}
 face_detection_active = {}
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
 # Utility functions for validation
 def validate_request_data(data, required_fields):
@@ -140,6 +147,19 @@ def init_database():
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
+def prewarm_db_pool():
+    """Mở sẵn pool_size connections rồi trả lại pool"""
+    try:
+        with app.app_context():
+            pool = db.engine.pool
+            size = pool.size() if hasattr(pool, 'size') else 0
+            connections = [db.engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.close()
+        logger.info(f"Đã pre-warm {size} database connections")
+    except Exception as e:
+        logger.warning(f"Không pre-warm được database pool: {e}")
+
 def migrate_from_json():
     """Migrate camera data from JSON file to database"""
     try:
@@ -501,14 +521,29 @@ def run_async_face_detection(schedule_id, camera_ids, duration):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
-        # Run the async detection
-        loop.run_until_complete(async_face_detection_loop(schedule_id, camera_ids, duration))
+        # Run the async detection (app context cho các DB call của loop)
+        with app.app_context():
+            loop.run_until_complete(async_face_detection_loop(schedule_id, camera_ids, duration))
         
     except Exception as e:
         logger.error(f"Lỗi trong run_async_face_detection: {e}")
     finally:
         loop.close()
 
+def _is_schedule_active(schedule_id):
+    """Schedule còn active không (blocking DB call, gọi qua asyncio.to_thread)"""
+    schedule = DetectionSchedule.query.get(schedule_id)
+    return schedule is not None and schedule.status == 'active'
+
+def _finish_schedule(schedule_id, status):
+    """Đánh dấu schedule kết thúc (blocking DB call, gọi qua asyncio.to_thread)"""
+    schedule = DetectionSchedule.query.get(schedule_id)
+    if schedule:
+        schedule.status = status
+        if status == 'completed':
+            schedule.end_time = datetime.utcnow()
+        db.session.commit()
+
 async def async_face_detection_loop(schedule_id, camera_ids, duration):
     """Async face detection loop"""
     try:
@@ -519,14 +554,15 @@ async def async_face_detection_loop(schedule_id, camera_ids, duration):
         
         while time.time() < end_time:
             # Check if schedule is still active
-            schedule = DetectionSchedule.query.get(schedule_id)
-            if not schedule or schedule.status != 'active':
+            if not await asyncio.to_thread(_is_schedule_active, schedule_id):
                 break
             
             # Process multiple cameras in parallel
             results = await detection_service.process_multiple_cameras_async(camera_ids, schedule_id)
             
             # Send WebSocket notifications for successful detections
+            camera_ids_detected = list({r["camera_id"] for r in results if r})
+            cameras = await asyncio.to_thread(CameraService.get_cameras_by_ids, camera_ids_detected) if camera_ids_detected else {}
             for result in results:
                 if result:
                     detection_data = {
@@ -535,7 +571,7 @@ async def async_face_detection_loop(schedule_id, camera_ids, duration):
                         "image_path": result["image_path"],
                         "faces_count": result["faces_count"],
                         "schedule_id": result["schedule_id"],
-                        "camera_info": CameraService.get_camera_by_id(result["camera_id"]) or {}
+                        "camera_info": cameras.get(result["camera_id"], {})
                     }
                     socketio.emit('face_detected', detection_data)
                     logger.info(f"Async phát hiện {result['faces_count']} khuôn mặt camera {result['camera_id']}")
@@ -544,11 +580,7 @@ async def async_face_detection_loop(schedule_id, camera_ids, duration):
             await asyncio.sleep(2)
         
         # Mark schedule as completed
-        schedule = DetectionSchedule.query.get(schedule_id)
-        if schedule:
-            schedule.status = 'completed'
-            schedule.end_time = datetime.utcnow()
-            db.session.commit()
+        await asyncio.to_thread(_finish_schedule, schedule_id, 'completed')
         
         logger.info(f"Hoàn thành async face detection cho schedule {schedule_id}")
         
@@ -556,10 +588,7 @@ async def async_face_detection_loop(schedule_id, camera_ids, duration):
         logger.error(f"Lỗi trong async_face_detection_loop: {e}")
         # Mark schedule as error
         try:
-            schedule = DetectionSchedule.query.get(schedule_id)
-            if schedule:
-                schedule.status = 'error'
-                db.session.commit()
+            await asyncio.to_thread(_finish_schedule, schedule_id, 'error')
         except:
             pass
 
@@ -589,7 +618,7 @@ def test_face_detection():
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
         # Phát hiện khuôn mặt
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        faces = get_thread_face_cascade().detectMultiScale(gray, **HAAR_DETECT_KWARGS)
         
         # Vẽ hình chữ nhật xung quanh khuôn mặt
         for (x, y, w, h) in faces:
@@ -707,7 +736,7 @@ def health_check():
         
         # Check active streams
         try:
-            active_streams = StreamService.get_active_streams(use_cache=False)
+            active_streams = StreamService.get_active_streams()
             health_status["components"]["streams"] = {
                 "status": "healthy",
                 "active_count": len(active_streams)
@@ -774,7 +803,7 @@ def get_metrics():
         
         # Stream metrics
         try:
-            active_streams = StreamService.get_active_streams(use_cache=False)
+            active_streams = StreamService.get_active_streams()
             metrics["streams"] = {
                 "active_count": len(active_streams),
                 "active_streams": active_streams,
@@ -856,6 +885,10 @@ app.start_time = time.time()
 
 try:
     init_database()
+    with app.app_context():
+        StreamService.sync_active_streams()
+    if app.config.get('DB_POOL_PREWARM'):
+        prewarm_db_pool()
     logger.info("✅ Ứng dụng khởi tạo thành công")
     logger.info(f"📊 Logging system: {len(logger.handlers)} handlers configured")
     logger.info(f"🗄️  Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
@@ -1,16 +1,73 @@
 import redis
 import json
 import logging
-from typing import Any, Optional, List, Dict
+from typing import Any, Optional, List, Dict, Tuple
 from functools import wraps
+import threading
 import time
 
+try:
+    import zstandard as zstd
+except ImportError:  # Chạy không nén nếu chưa cài zstandard
+    zstd = None
+
 logger = logging.getLogger(__name__)
 
+# Payload lớn hơn ngưỡng này được nén zstd trước khi lưu vào Redis
+COMPRESS_MIN_SIZE = 4096
+COMPRESS_LEVEL = 3
+_COMPRESSED_MAGIC = b'\x1fZ'  # JSON không bao giờ bắt đầu bằng byte 0x1f
+
+# ZstdCompressor/ZstdDecompressor không thread-safe -> mỗi thread một context
+_zstd_local = threading.local()
+
+def _zstd_contexts():
+    """Lấy (compressor, decompressor) của thread hiện tại"""
+    contexts = getattr(_zstd_local, 'contexts', None)
+    if contexts is None:
+        contexts = (zstd.ZstdCompressor(level=COMPRESS_LEVEL), zstd.ZstdDecompressor())
+        _zstd_local.contexts = contexts
+    return contexts
+
+def _serialize(value: Any) -> bytes:
+    """JSON-encode value, nén zstd nếu payload lớn"""
+    serialized = json.dumps(value, default=str).encode('utf-8')
+    if zstd is not None and len(serialized) > COMPRESS_MIN_SIZE:
+        return _COMPRESSED_MAGIC + _zstd_contexts()[0].compress(serialized)
+    return serialized
+
+def _deserialize(data: bytes) -> Any:
+    """Giải nén (nếu có magic prefix) và JSON-decode"""
+    if data[:2] == _COMPRESSED_MAGIC:
+        if zstd is None:
+            raise RuntimeError("Cache value được nén zstd nhưng chưa cài zstandard")
+        data = _zstd_contexts()[1].decompress(data[2:])
+    return json.loads(data)
+
+_INCR_IF_EXISTS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+# GET KEYS[1] + DECR KEYS[2] chỉ khi counter còn tồn tại (DECR trần sẽ tạo counter -1 không có TTL).
+# Counter mất/hết hạn trong khi data còn -> trả về 0 để caller refresh và đặt lại counter
+_GET_AND_DECR_LUA = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return {false, false}
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return {data, redis.call('DECR', KEYS[2])}
+end
+return {data, 0}
+"""
+
 class CacheManager:
     """Quản lý Redis cache"""
     
-    def __init__(self, host='localhost', port=6379, db=0, decode_responses=True):
+    def __init__(self, host='localhost', port=6379, db=0, decode_responses=False):
         try:
             self.redis_client = redis.Redis(
                 host=host, 
@@ -23,21 +80,39 @@ class CacheManager:
             # Test connection
             self.redis_client.ping()
             self.is_available = True
+            self.supports_unlink = self._detect_unlink_support()
+            self._incr_if_exists_script = self.redis_client.register_script(_INCR_IF_EXISTS_LUA)
+            self._get_and_decr_script = self.redis_client.register_script(_GET_AND_DECR_LUA)
             logger.info("Redis cache kết nối thành công")
         except (redis.ConnectionError, redis.TimeoutError) as e:
             logger.warning(f"Không thể kết nối Redis: {e}. Chạy không có cache.")
             self.redis_client = None
             self.is_available = False
+            self.supports_unlink = False
+            # Chuyển sang null-object: mọi method trả về ngay, không cần check is_available
+            self.__class__ = NullCacheManager
+    
+    def _detect_unlink_support(self) -> bool:
+        """UNLINK (giải phóng bộ nhớ non-blocking) có từ Redis 4.0"""
+        try:
+            version = self.redis_client.info('server').get('redis_version', '0')
+            return int(str(version).split('.')[0]) >= 4
+        except Exception as e:
+            logger.warning(f"Không xác định được Redis version, dùng DEL: {e}")
+            return False
+    
+    def _remove(self, *keys) -> int:
+        """Xóa keys bằng UNLINK nếu server hỗ trợ, ngược lại DEL"""
+        if self.supports_unlink:
+            return self.redis_client.unlink(*keys)
+        return self.redis_client.delete(*keys)
     
     def get(self, key: str) -> Optional[Any]:
         """Lấy dữ liệu từ cache"""
-        if not self.is_available:
-            return None
-        
         try:
             data = self.redis_client.get(key)
             if data:
-                return json.loads(data)
+                return _deserialize(data)
             return None
         except Exception as e:
             logger.error(f"Lỗi khi lấy cache {key}: {e}")
@@ -45,46 +120,94 @@ class CacheManager:
     
     def set(self, key: str, value: Any, expire: int = 300) -> bool:
         """Lưu dữ liệu vào cache"""
-        if not self.is_available:
-            return False
-        
         try:
-            serialized = json.dumps(value, default=str)
+            serialized = _serialize(value)
             return self.redis_client.setex(key, expire, serialized)
         except Exception as e:
             logger.error(f"Lỗi khi lưu cache {key}: {e}")
             return False
     
+    def get_and_decr(self, key: str, counter_key: str) -> Tuple[Optional[Any], Optional[int]]:
+        """GET key + DECR counter_key trong một round-trip (atomic, Lua)
+        
+        Trả về (value, counter sau khi giảm); counter 0 nếu counter không còn tồn tại,
+        (None, None) nếu miss hoặc lỗi. Không bao giờ tạo counter mới.
+        """
+        try:
+            data, remaining = self._get_and_decr_script(keys=[key, counter_key])
+            if not data:
+                return None, None
+            return _deserialize(data), remaining
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy cache {key}: {e}")
+            return None, None
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Lấy nhiều key trong một round-trip (MGET), chỉ trả về các key có trong cache"""
+        if not keys:
+            return {}
+        
+        try:
+            return {key: _deserialize(data)
+                    for key, data in zip(keys, self.redis_client.mget(keys)) if data}
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy nhiều cache ({len(keys)} keys): {e}")
+            return {}
+    
+    def set_many(self, items: Dict[str, Any], expire: int = 300) -> bool:
+        """Lưu nhiều key vào cache trong một round-trip (pipeline)"""
+        if not items:
+            return True
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, expire, _serialize(value))
+            return all(pipe.execute())
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu nhiều cache ({len(items)} keys): {e}")
+            return False
+    
     def delete(self, key: str) -> bool:
         """Xóa cache"""
-        if not self.is_available:
-            return False
-        
         try:
-            return bool(self.redis_client.delete(key))
+            return bool(self._remove(key))
         except Exception as e:
             logger.error(f"Lỗi khi xóa cache {key}: {e}")
             return False
     
     def delete_pattern(self, pattern: str) -> int:
         """Xóa nhiều cache theo pattern"""
-        if not self.is_available:
-            return 0
-        
         try:
             keys = self.redis_client.keys(pattern)
             if keys:
-                return self.redis_client.delete(*keys)
+                return self._remove(*keys)
             return 0
         except Exception as e:
             logger.error(f"Lỗi khi xóa cache pattern {pattern}: {e}")
             return 0
     
+    def delete_many(self, keys: List[str]) -> int:
+        """Xóa nhiều key trong một lệnh"""
+        if not keys:
+            return 0
+        
+        try:
+            return self._remove(*keys)
+        except Exception as e:
+            logger.error(f"Lỗi khi xóa {len(keys)} cache keys: {e}")
+            return 0
+    
+    def incr_if_exists(self, key: str, amount: int = 1) -> Optional[int]:
+        """INCRBY chỉ khi key đã tồn tại (atomic, Lua); None nếu key không có"""
+        try:
+            return self._incr_if_exists_script(keys=[key], args=[amount])
+        except Exception as e:
+            logger.error(f"Lỗi khi tăng cache {key}: {e}")
+            return None
+    
     def exists(self, key: str) -> bool:
         """Kiểm tra cache có tồn tại không"""
-        if not self.is_available:
-            return False
-        
         try:
             return bool(self.redis_client.exists(key))
         except Exception as e:
@@ -93,39 +216,200 @@ class CacheManager:
     
     def expire(self, key: str, expire: int) -> bool:
         """Đặt thời gian hết hạn cho cache"""
-        if not self.is_available:
-            return False
-        
         try:
             return bool(self.redis_client.expire(key, expire))
         except Exception as e:
             logger.error(f"Lỗi khi đặt expire cache {key}: {e}")
             return False
     
-    def flush_all(self) -> bool:
-        """Xóa tất cả cache"""
-        if not self.is_available:
+    def get_version(self, key: str) -> int:
+        """Đọc version counter (0 nếu chưa có)"""
+        try:
+            return int(self.redis_client.get(key) or 0)
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc version {key}: {e}")
+            return 0
+    
+    def incr_version(self, key: str) -> int:
+        """Tăng version counter, các key gắn version cũ tự hết hạn theo TTL"""
+        try:
+            return self.redis_client.incr(key)
+        except Exception as e:
+            logger.error(f"Lỗi khi tăng version {key}: {e}")
+            return 0
+    
+    def acquire_lock(self, key: str, timeout: int = 10) -> bool:
+        """Lấy lock ngắn hạn (SET NX EX); True nếu lỗi để không chặn caller"""
+        try:
+            return bool(self.redis_client.set(key, "1", ex=timeout, nx=True))
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy lock {key}: {e}")
+            return True
+    
+    def release_lock(self, key: str) -> bool:
+        """Giải phóng lock đã lấy bằng acquire_lock"""
+        try:
+            return bool(self._remove(key))
+        except Exception as e:
+            logger.error(f"Lỗi khi giải phóng lock {key}: {e}")
             return False
+    
+    def set_add_bounded(self, key: str, member: str, limit: int) -> Optional[bool]:
+        """SADD nếu set chưa vượt limit (SADD + SCARD một round-trip)
         
+        True nếu member nằm trong set, False nếu set đã đầy, None nếu lỗi Redis.
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.sadd(key, member)
+            pipe.scard(key)
+            added, size = pipe.execute()
+            if added and size > limit:
+                # Process khác đã lấp đầy set trước -> hoàn tác
+                self.redis_client.srem(key, member)
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi SADD {key}: {e}")
+            return None
+    
+    def set_remove(self, key: str, *members: str) -> Optional[int]:
+        """SREM members khỏi set (None nếu lỗi Redis)"""
+        try:
+            return self.redis_client.srem(key, *members)
+        except Exception as e:
+            logger.error(f"Lỗi khi SREM {key}: {e}")
+            return None
+    
+    def set_replace(self, key: str, members: List[str]) -> Optional[bool]:
+        """Thay toàn bộ set bằng members (DEL + SADD trong một MULTI; None nếu lỗi Redis)"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(key)
+            if members:
+                pipe.sadd(key, *members)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi thay set {key}: {e}")
+            return None
+    
+    def set_members(self, key: str) -> Optional[List[str]]:
+        """SMEMBERS dưới dạng list str (None nếu lỗi Redis)"""
+        try:
+            return [m.decode('utf-8') if isinstance(m, bytes) else m
+                    for m in self.redis_client.smembers(key)]
+        except Exception as e:
+            logger.error(f"Lỗi khi SMEMBERS {key}: {e}")
+            return None
+    
+    def flush_all(self) -> bool:
+        """Xóa tất cả cache"""
         try:
             return self.redis_client.flushdb()
         except Exception as e:
             logger.error(f"Lỗi khi flush cache: {e}")
             return False
 
+class NullCacheManager(CacheManager):
+    """CacheManager khi Redis không khả dụng: mọi thao tác là no-op"""
+    
+    def get(self, key: str) -> Optional[Any]:
+        return None
+    
+    def set(self, key: str, value: Any, expire: int = 300) -> bool:
+        return False
+    
+    def get_and_decr(self, key: str, counter_key: str) -> Tuple[Optional[Any], Optional[int]]:
+        return None, None
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return {}
+    
+    def set_many(self, items: Dict[str, Any], expire: int = 300) -> bool:
+        return False
+    
+    def delete(self, key: str) -> bool:
+        return False
+    
+    def delete_pattern(self, pattern: str) -> int:
+        return 0
+    
+    def delete_many(self, keys: List[str]) -> int:
+        return 0
+    
+    def incr_if_exists(self, key: str, amount: int = 1) -> Optional[int]:
+        return None
+    
+    def exists(self, key: str) -> bool:
+        return False
+    
+    def expire(self, key: str, expire: int) -> bool:
+        return False
+    
+    def get_version(self, key: str) -> int:
+        return 0
+    
+    def incr_version(self, key: str) -> int:
+        return 0
+    
+    def acquire_lock(self, key: str, timeout: int = 10) -> bool:
+        # Không có Redis để phối hợp, cho phép caller tự tính
+        return True
+    
+    def release_lock(self, key: str) -> bool:
+        return False
+    
+    # None -> caller dùng tracking trong process
+    def set_add_bounded(self, key: str, member: str, limit: int) -> Optional[bool]:
+        return None
+    
+    def set_remove(self, key: str, *members: str) -> Optional[int]:
+        return None
+    
+    def set_replace(self, key: str, members: List[str]) -> Optional[bool]:
+        return None
+    
+    def set_members(self, key: str) -> Optional[List[str]]:
+        return None
+    
+    def flush_all(self) -> bool:
+        return False
+
+# Số lần hit trước khi danh sách camera được refresh từ DB
+CAMERAS_ALL_REFRESH_HITS = 1000
+
+# Cache key namespace version - tăng khi deploy để bỏ toàn bộ key cũ (hết hạn theo TTL)
+CACHE_KEY_VERSION = "v1"
+
 # Cache keys constants
 class CacheKeys:
-    CAMERAS_ALL = "cameras:all"
-    CAMERA_DETAIL = "camera:detail:{}"
-    ACTIVE_STREAMS = "streams:active"
-    DETECTION_RESULTS = "detections:results:page:{}"
-    DETECTION_COUNT = "detections:count"
-    CAMERA_STATS = "camera:stats:{}"
-    SCHEDULE_ACTIVE = "schedules:active"
+    CAMERAS_VERSION = f"{CACHE_KEY_VERSION}:cameras:version"
+    ACTIVE_STREAMS = f"{CACHE_KEY_VERSION}:streams:active:set"  # Redis SET, chia sẻ giữa các worker
+    DETECTION_COUNT = f"{CACHE_KEY_VERSION}:detections:count"
+    DETECTION_RESULTS_VERSION = f"{CACHE_KEY_VERSION}:detections:version"
+    SCHEDULE_ACTIVE = f"{CACHE_KEY_VERSION}:schedules:active"
+    
+    # Patterns dùng cho delete_pattern
+    CAMERA_PATTERN = f"{CACHE_KEY_VERSION}:camera:*"
+    
+    # Keys có tham số: callable thay vì str.format
+    CAMERAS_ALL = staticmethod(lambda version=0: f"{CACHE_KEY_VERSION}:cameras:all:v{version}")
+    CAMERAS_ALL_HITS = staticmethod(lambda version=0: f"{CACHE_KEY_VERSION}:cameras:all:v{version}:hits")
+    CAMERA_DETAIL = staticmethod(lambda camera_id: f"{CACHE_KEY_VERSION}:camera:detail:{camera_id}")
+    CAMERA_STATS = staticmethod(lambda camera_id: f"{CACHE_KEY_VERSION}:camera:stats:{camera_id}")
+    DETECTION_RESULTS = staticmethod(
+        lambda page, version=0: f"{CACHE_KEY_VERSION}:detections:results:v{version}:page:{page}"
+    )
 
 # Cache decorators
-def cached(expire: int = 300, key_func=None):
-    """Decorator để cache kết quả function"""
+def cached(expire: int = 300, key_func=None, lock_timeout: int = 10,
+           lock_retries: int = 3, lock_retry_delay: float = 0.05):
+    """Decorator để cache kết quả function
+    
+    Khi cache miss chỉ một caller được tính lại (lock SET NX), các caller khác
+    chờ ngắn rồi đọc lại cache để tránh thundering herd vào database.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -133,19 +417,33 @@ def cached(expire: int = 300, key_func=None):
             if key_func:
                 cache_key = key_func(*args, **kwargs)
             else:
-                cache_key = f"func:{func.__name__}:{hash(str(args) + str(kwargs))}"
+                cache_key = f"{CACHE_KEY_VERSION}:func:{func.__name__}:{hash(str(args) + str(kwargs))}"
             
             # Try to get from cache
             cached_result = cache_manager.get(cache_key)
             if cached_result is not None:
                 return cached_result
             
-            # Execute function
-            result = func(*args, **kwargs)
+            lock_key = f"lock:{cache_key}"
+            if not cache_manager.acquire_lock(lock_key, lock_timeout):
+                # Caller khác đang tính, chờ kết quả được ghi vào cache
+                for _ in range(lock_retries):
+                    time.sleep(lock_retry_delay)
+                    cached_result = cache_manager.get(cache_key)
+                    if cached_result is not None:
+                        return cached_result
+                # Hết thời gian chờ: tự tính, không ghi đè lock của caller kia
+                return func(*args, **kwargs)
             
-            # Save to cache
-            cache_manager.set(cache_key, result, expire)
-            return result
+            try:
+                # Execute function
+                result = func(*args, **kwargs)
+                
+                # Save to cache
+                cache_manager.set(cache_key, result, expire)
+                return result
+            finally:
+                cache_manager.release_lock(lock_key)
         
         return wrapper
     return decorator
@@ -170,63 +468,95 @@ class CameraCache:
     
     @staticmethod
     def get_all_cameras():
-        """Lấy danh sách tất cả camera từ cache"""
-        return cache_manager.get(CacheKeys.CAMERAS_ALL)
+        """Lấy danh sách tất cả camera từ cache
+        
+        Mỗi lần hit giảm access counter; caller làm counter về 0 nhận None và refresh,
+        các caller khác vẫn dùng bản cache -> không bị thundering herd khi refresh.
+        """
+        version = cache_manager.get_version(CacheKeys.CAMERAS_VERSION)
+        cameras, remaining = cache_manager.get_and_decr(
+            CacheKeys.CAMERAS_ALL(version), CacheKeys.CAMERAS_ALL_HITS(version)
+        )
+        if cameras is not None and remaining == 0:
+            return None
+        return cameras
     
     @staticmethod
     def set_all_cameras(cameras: Dict, expire: int = 300):
-        """Lưu danh sách camera vào cache"""
-        return cache_manager.set(CacheKeys.CAMERAS_ALL, cameras, expire)
+        """Lưu danh sách camera (key gắn version) và reset access counter"""
+        version = cache_manager.get_version(CacheKeys.CAMERAS_VERSION)
+        return cache_manager.set_many({
+            CacheKeys.CAMERAS_ALL(version): cameras,
+            CacheKeys.CAMERAS_ALL_HITS(version): CAMERAS_ALL_REFRESH_HITS
+        }, expire)
     
     @staticmethod
     def get_camera_detail(camera_id: str):
         """Lấy chi tiết camera từ cache"""
-        key = CacheKeys.CAMERA_DETAIL.format(camera_id)
+        key = CacheKeys.CAMERA_DETAIL(camera_id)
         return cache_manager.get(key)
     
     @staticmethod
     def set_camera_detail(camera_id: str, camera_data: Dict, expire: int = 600):
         """Lưu chi tiết camera vào cache"""
-        key = CacheKeys.CAMERA_DETAIL.format(camera_id)
+        key = CacheKeys.CAMERA_DETAIL(camera_id)
         return cache_manager.set(key, camera_data, expire)
     
+    @staticmethod
+    def mget_camera_details(camera_ids: List[str]) -> Dict[str, Dict]:
+        """Lấy chi tiết nhiều camera trong một MGET (chỉ các camera có trong cache)"""
+        keys = {CacheKeys.CAMERA_DETAIL(camera_id): camera_id for camera_id in camera_ids}
+        return {keys[key]: camera for key, camera in cache_manager.get_many(list(keys)).items()}
+    
+    @staticmethod
+    def set_camera_details(cameras: Dict[str, Dict], expire: int = 600):
+        """Lưu chi tiết nhiều camera cùng lúc"""
+        items = {CacheKeys.CAMERA_DETAIL(camera_id): camera for camera_id, camera in cameras.items()}
+        return cache_manager.set_many(items, expire)
+    
+    @staticmethod
+    def invalidate_camera_list():
+        """Bỏ danh sách tất cả camera (O(1): tăng version, key cũ hết hạn theo TTL)"""
+        cache_manager.incr_version(CacheKeys.CAMERAS_VERSION)
+    
     @staticmethod
     def invalidate_camera(camera_id: str):
-        """Xóa cache của camera"""
-        # Xóa cache chi tiết
-        detail_key = CacheKeys.CAMERA_DETAIL.format(camera_id)
-        cache_manager.delete(detail_key)
-        
-        # Xóa cache danh sách tất cả
-        cache_manager.delete(CacheKeys.CAMERAS_ALL)
-        
-        # Xóa cache stats
-        stats_key = CacheKeys.CAMERA_STATS.format(camera_id)
-        cache_manager.delete(stats_key)
+        """Xóa cache của một camera (chi tiết + stats) và danh sách tất cả"""
+        cache_manager.delete(CacheKeys.CAMERA_DETAIL(camera_id))
+        cache_manager.delete(CacheKeys.CAMERA_STATS(camera_id))
+        CameraCache.invalidate_camera_list()
     
     @staticmethod
     def invalidate_all():
         """Xóa tất cả cache của camera"""
-        cache_manager.delete_pattern("camera:*")
-        cache_manager.delete(CacheKeys.CAMERAS_ALL)
+        cache_manager.delete_pattern(CacheKeys.CAMERA_PATTERN)
+        CameraCache.invalidate_camera_list()
 
 class StreamCache:
-    """Cache utilities cho streaming"""
+    """Tracking stream đang hoạt động bằng Redis SET (đúng cho nhiều gunicorn worker)
+    
+    Các method trả về None khi Redis không khả dụng để caller dùng set trong process.
+    """
+    
+    @staticmethod
+    def get_active_streams() -> Optional[List[str]]:
+        """Lấy danh sách stream đang hoạt động (SMEMBERS)"""
+        return cache_manager.set_members(CacheKeys.ACTIVE_STREAMS)
     
     @staticmethod
-    def get_active_streams():
-        """Lấy danh sách stream đang hoạt động"""
-        return cache_manager.get(CacheKeys.ACTIVE_STREAMS)
+    def add_stream(camera_id: str, limit: int) -> Optional[bool]:
+        """Thêm stream nếu chưa vượt limit; False nếu đã đủ limit"""
+        return cache_manager.set_add_bounded(CacheKeys.ACTIVE_STREAMS, camera_id, limit)
     
     @staticmethod
-    def set_active_streams(streams: List, expire: int = 60):
-        """Lưu danh sách stream đang hoạt động"""
-        return cache_manager.set(CacheKeys.ACTIVE_STREAMS, streams, expire)
+    def remove_streams(*camera_ids: str) -> Optional[int]:
+        """Bỏ các stream khỏi set"""
+        return cache_manager.set_remove(CacheKeys.ACTIVE_STREAMS, *camera_ids)
     
     @staticmethod
-    def invalidate_streams():
-        """Xóa cache streams"""
-        cache_manager.delete(CacheKeys.ACTIVE_STREAMS)
+    def replace_streams(camera_ids: List[str]) -> Optional[bool]:
+        """Dựng lại set từ danh sách camera (vd từ DB lúc khởi động)"""
+        return cache_manager.set_replace(CacheKeys.ACTIVE_STREAMS, camera_ids)
 
 class DetectionCache:
     """Cache utilities cho detection results"""
@@ -234,19 +564,36 @@ class DetectionCache:
     @staticmethod
     def get_detection_results(page: int = 1):
         """Lấy kết quả phát hiện theo trang"""
-        key = CacheKeys.DETECTION_RESULTS.format(page)
+        version = cache_manager.get_version(CacheKeys.DETECTION_RESULTS_VERSION)
+        key = CacheKeys.DETECTION_RESULTS(page, version)
         return cache_manager.get(key)
     
     @staticmethod
     def set_detection_results(page: int, results: List, expire: int = 120):
         """Lưu kết quả phát hiện theo trang"""
-        key = CacheKeys.DETECTION_RESULTS.format(page)
-        return cache_manager.set(key, results, expire)
+        return DetectionCache.set_detection_results_bulk({page: results}, expire)
+    
+    @staticmethod
+    def set_detection_results_bulk(pages: Dict[int, List], expire: int = 120):
+        """Lưu nhiều trang kết quả phát hiện cùng lúc (warm-up sau invalidation)"""
+        version = cache_manager.get_version(CacheKeys.DETECTION_RESULTS_VERSION)
+        items = {CacheKeys.DETECTION_RESULTS(page, version): results for page, results in pages.items()}
+        return cache_manager.set_many(items, expire)
+    
+    @staticmethod
+    def invalidate_for_insert(inserted: int = 1):
+        """Sau khi insert detection: bỏ mọi trang (tăng version, O(1)), cộng thêm vào tổng số
+        
+        Row mới (timestamp = now) đứng đầu listing ORDER BY timestamp DESC nên dịch chuyển
+        mọi trang; tổng số được INCRBY thay vì xóa để không phải COUNT lại.
+        """
+        cache_manager.incr_version(CacheKeys.DETECTION_RESULTS_VERSION)
+        cache_manager.incr_if_exists(CacheKeys.DETECTION_COUNT, inserted)
     
     @staticmethod
     def invalidate_detection_results():
-        """Xóa cache kết quả phát hiện"""
-        cache_manager.delete_pattern("detections:results:*")
+        """Xóa cache kết quả phát hiện (O(1): tăng version, không quét keys)"""
+        cache_manager.incr_version(CacheKeys.DETECTION_RESULTS_VERSION)
         cache_manager.delete(CacheKeys.DETECTION_COUNT)
     
     @staticmethod
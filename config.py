@@ -1,9 +1,20 @@
 import os
+import re
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+_IP_PATTERN = re.compile(
+    r'^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
+)
+
+@lru_cache(maxsize=4096)
+def _is_valid_ip(ip):
+    """Kiểm tra định dạng IP (kết quả được cache, bounded LRU)"""
+    return _IP_PATTERN.match(ip) is not None
+
 class Config:
     """Cấu hình cơ bản cho ứng dụng"""
     
@@ -16,9 +27,9 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'connect_args': {'check_same_thread': False} if 'sqlite' in os.environ.get('DATABASE_URL', 'sqlite') else {}
+        'pool_recycle': 300
     }
+    DB_POOL_PREWARM = False
     
     # Redis Configuration
     REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
@@ -45,11 +56,15 @@ class Config:
     # Rate Limiting
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL') or f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
     RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', "100/hour")
+    # Sliding window (Lua script atomic trên Redis), không bị burst 2x ở biên như fixed-window
+    RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', 'moving-window')
     RATELIMIT_HEADERS_ENABLED = True
     
     # Async Processing
     MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 4))
     FACE_DETECTION_TIMEOUT = int(os.environ.get('FACE_DETECTION_TIMEOUT', 30))  # seconds
+    # YuNet int8 ONNX model; nếu không có file thì dùng Haar cascade
+    YUNET_MODEL_PATH = os.environ.get('YUNET_MODEL_PATH', 'models/face_detection_yunet_2023mar_int8.onnx')
     
     # Security Settings
     ALLOWED_EXTENSIONS = set(os.environ.get('ALLOWED_EXTENSIONS', 'jpg,jpeg,png').split(','))
@@ -63,9 +78,9 @@ class Config:
     @staticmethod
     def validate_ip(ip):
         """Validate IP address format"""
-        import re
-        pattern = r'^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-        return re.match(pattern, ip) is not None
+        if not isinstance(ip, str):
+            return False
+        return _is_valid_ip(ip)
     
     @staticmethod
     def validate_camera_data(data):
@@ -89,6 +104,14 @@ class Config:
         
         return errors
     
+    @classmethod
+    def engine_options(cls):
+        """SQLAlchemy engine options theo database URI của chính config class"""
+        options = dict(cls.SQLALCHEMY_ENGINE_OPTIONS)
+        if cls.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+            options['connect_args'] = {'check_same_thread': False}
+        return options
+    
     @staticmethod
     def init_app(app):
         """Initialize app with config"""
@@ -126,12 +149,17 @@ class ProductionConfig(Config):
     RATELIMIT_DEFAULT = "100/hour"
     
     # Production-specific SQLAlchemy settings
+    # Pool cố định 2 connection / camera stream (không overflow -> không mở connection mới giữa burst);
+    # LIFO giữ ít connection "nóng", phần còn lại idle và bị recycle
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
-        'pool_recycle': 120,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', Config.MAX_CAMERAS_STREAM * 2)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 0)),
+        'pool_recycle': 1800,
         'pool_pre_ping': True,
-        'max_overflow': 20
+        'pool_use_lifo': True
     }
+    # Mở sẵn pool_size connections lúc khởi động (TCP + auth không rơi vào các batch detection đầu)
+    DB_POOL_PREWARM = os.environ.get('DB_POOL_PREWARM', 'True').lower() == 'true'
     
     @classmethod
     def init_app(cls, app):
@@ -2,16 +2,50 @@ import logging
 import logging.handlers
 import os
 import json
-from datetime import datetime
+import time
+import copy
+import queue
+import atexit
+from json.encoder import encode_basestring as _encode_json_str
 from typing import Dict, Any
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter cho structured logging"""
     
+    # Thuộc tính chuẩn của LogRecord, không đưa vào log như extra fields
+    _RESERVED = frozenset((
+        'name', 'msg', 'args', 'levelname', 'levelno', 'pathname', 'filename',
+        'module', 'lineno', 'funcName', 'created', 'msecs', 'relativeCreated',
+        'thread', 'threadName', 'processName', 'process', 'exc_info', 'exc_text',
+        'stack_info', 'getMessage', 'message', 'asctime', 'taskName'
+    ))
+    
+    # Template cho record không có extras/exception, cùng output với json.dumps
+    _FAST_FMT = ('{"timestamp": "%s", "level": %s, "logger": %s, "message": %s, '
+                 '"module": %s, "function": %s, "line": %d}')
+    
+    @staticmethod
+    def _timestamp(record):
+        return "%s.%03dZ" % (time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)), record.msecs)
+    
     def format(self, record):
         """Format log record thành JSON"""
+        has_extras = not self._RESERVED.issuperset(record.__dict__)
+        
+        # Fast path: không cần build dict khi record chỉ có các field chuẩn
+        if not has_extras and not record.exc_info:
+            return self._FAST_FMT % (
+                self._timestamp(record),
+                _encode_json_str(record.levelname),
+                _encode_json_str(record.name),
+                _encode_json_str(record.getMessage()),
+                _encode_json_str(record.module),
+                _encode_json_str(record.funcName) if record.funcName is not None else 'null',
+                record.lineno
+            )
+        
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": self._timestamp(record),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -25,15 +59,96 @@ class JSONFormatter(logging.Formatter):
             log_entry["exception"] = self.formatException(record.exc_info)
         
         # Thêm extra fields nếu có
-        for key, value in record.__dict__.items():
-            if key not in ('name', 'msg', 'args', 'levelname', 'levelno', 'pathname', 'filename',
-                          'module', 'lineno', 'funcName', 'created', 'msecs', 'relativeCreated',
-                          'thread', 'threadName', 'processName', 'process', 'exc_info', 'exc_text',
-                          'stack_info', 'getMessage'):
-                log_entry[key] = value
+        if has_extras:
+            for key, value in record.__dict__.items():
+                if key not in self._RESERVED:
+                    log_entry[key] = value
         
         return json.dumps(log_entry, ensure_ascii=False)
 
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler cho queue trong cùng process: không format trước khi enqueue"""
+    
+    def prepare(self, record):
+        """Chốt message ngay lúc log, giữ nguyên exc_info cho JSONFormatter"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler không flush sau mỗi record, flush theo batch từ listener"""
+    
+    def flush(self):
+        pass
+    
+    def flush_batch(self):
+        super().flush()
+    
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """QueueListener drain tối đa batch_size records mỗi lượt rồi flush handlers một lần"""
+    
+    def __init__(self, queue, *handlers, respect_handler_level=False, batch_size=256):
+        super().__init__(queue, *handlers, respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+    
+    # Record đại diện cho lỗi flush (flush không gắn với record cụ thể nào)
+    _FLUSH_RECORD = logging.makeLogRecord({'msg': 'Flush log handler failed'})
+    
+    def _flush_handlers(self):
+        """Flush từng handler; lỗi (vd stream đã đóng lúc thoát) không được làm chết listener thread"""
+        for handler in self.handlers:
+            # Stream đã bị đóng (console stream lúc interpreter thoát): không còn gì để flush
+            if getattr(getattr(handler, 'stream', None), 'closed', False):
+                continue
+            try:
+                getattr(handler, 'flush_batch', handler.flush)()
+            except Exception:
+                handler.handleError(self._FLUSH_RECORD)
+    
+    def _monitor(self):
+        """Block chờ record đầu tiên, lấy tiếp những gì đang có trong queue, ghi cả batch"""
+        while True:
+            records = [self.dequeue(True)]
+            try:
+                while len(records) < self.batch_size:
+                    records.append(self.dequeue(False))
+            except queue.Empty:
+                pass
+            
+            stop = False
+            for record in records:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                self.handle(record)
+            self._flush_handlers()
+            if stop:
+                break
+
+class ExcludeLoggersFilter(logging.Filter):
+    """Loại bỏ records của các logger chuyên biệt khỏi handlers của root"""
+    
+    def __init__(self, names):
+        super().__init__()
+        self.names = tuple(names)
+        self.prefixes = tuple(f"{name}." for name in self.names)
+    
+    def filter(self, record):
+        return not (record.name in self.names or record.name.startswith(self.prefixes))
+
+# QueueListener dùng chung, ghi log xuống file trong background thread
+_log_listener = None
+
+def _stop_log_listener():
+    """Flush queue và dừng background thread của QueueListener"""
+    if _log_listener is not None and _log_listener._thread is not None:
+        _log_listener.stop()
+
 class RequestLogger:
     """Logger riêng cho HTTP requests"""
     
@@ -158,10 +273,9 @@ def setup_logging(app):
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     console_handler.setFormatter(console_formatter)
-    root_logger.addHandler(console_handler)
     
     # File handler với JSON format
-    file_handler = logging.handlers.RotatingFileHandler(
+    file_handler = BatchRotatingFileHandler(
         os.path.join(log_dir, 'app.log'),
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5,
@@ -169,10 +283,9 @@ def setup_logging(app):
     )
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(JSONFormatter())
-    root_logger.addHandler(file_handler)
     
     # Error file handler
-    error_handler = logging.handlers.RotatingFileHandler(
+    error_handler = BatchRotatingFileHandler(
         os.path.join(log_dir, 'error.log'),
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5,
@@ -180,7 +293,6 @@ def setup_logging(app):
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(JSONFormatter())
-    root_logger.addHandler(error_handler)
     
     # Separate loggers cho different components
     loggers_config = {
@@ -216,14 +328,16 @@ def setup_logging(app):
         }
     }
     
-    # Setup specialized loggers
+    # Root handlers không nhận records của các logger chuyên biệt (như propagate=False trước đây)
+    root_filter = ExcludeLoggersFilter(loggers_config.keys())
+    root_handlers = [console_handler, file_handler, error_handler]
+    for handler in root_handlers:
+        handler.addFilter(root_filter)
+    
+    # File handler cho từng logger chuyên biệt, lọc theo tên logger
+    component_handlers = []
     for logger_name, config in loggers_config.items():
-        logger = logging.getLogger(logger_name)
-        logger.setLevel(config['level'])
-        logger.propagate = False  # Không propagate lên root logger
-        
-        # File handler cho logger này
-        handler = logging.handlers.RotatingFileHandler(
+        handler = BatchRotatingFileHandler(
             os.path.join(log_dir, config['file']),
             maxBytes=config['max_bytes'],
             backupCount=config['backup_count'],
@@ -231,7 +345,36 @@ def setup_logging(app):
         )
         handler.setLevel(config['level'])
         handler.setFormatter(JSONFormatter())
-        logger.addHandler(handler)
+        handler.addFilter(logging.Filter(logger_name))
+        component_handlers.append(handler)
+    
+    # Tất cả disk I/O chạy trong BatchQueueListener, request path chỉ enqueue vào SimpleQueue
+    global _log_listener
+    if _log_listener is None:
+        atexit.register(_stop_log_listener)
+    else:
+        _stop_log_listener()
+        # Handlers của lần setup trước không còn dùng: đóng để không giữ file descriptor
+        for handler in _log_listener.handlers:
+            handler.close()
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    
+    root_logger.addHandler(queue_handler)
+    
+    # Setup specialized loggers
+    for logger_name, config in loggers_config.items():
+        logger = logging.getLogger(logger_name)
+        logger.setLevel(config['level'])
+        logger.propagate = False  # Không propagate lên root logger
+        logger.handlers.clear()
+        logger.addHandler(queue_handler)
+    
+    _log_listener = BatchQueueListener(
+        log_queue, *root_handlers, *component_handlers, respect_handler_level=True
+    )
+    _log_listener.start()
     
     # Disable werkzeug logging in production
     if not app.config.get('DEBUG', False):
@@ -1,11 +1,77 @@
-from flask import request, g, jsonify
+from flask import request, g, jsonify, current_app
+from flask.json.provider import JSONProvider
 from functools import wraps
 import time
 import gzip
+import hashlib
+import itertools
 import json
-from io import BytesIO
+import orjson
+import os
+import uuid
+from email.utils import formatdate
 from logger_config import request_logger, security_logger, performance_logger
 
+try:
+    # ISA-L: cùng định dạng gzip trên wire, nhanh hơn zlib 2-3x
+    from isal import igzip
+except ImportError:
+    igzip = None
+
+def gzip_compress(data, compresslevel):
+    """Nén gzip single-shot, dùng ISA-L nếu có, ngược lại zlib"""
+    if igzip is not None:
+        # ISA-L chỉ có level 0-3: quy đổi từ thang 1-9 của zlib
+        return igzip.compress(data, compresslevel=min(3, (compresslevel + 1) // 3))
+    return gzip.compress(data, compresslevel=compresslevel)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider dùng orjson (serialize trong C, ra bytes trực tiếp)"""
+    
+    mimetype = "application/json"
+    option = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=self.option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Giống jsonify mặc định nhưng ghi bytes của orjson thẳng vào body, không decode"""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=str, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+# Request ID = prefix riêng của process + counter tăng dần (không cần syscall thời gian)
+_request_counter = itertools.count()
+_request_id_prefix = None
+
+def _reset_request_id_prefix():
+    """Tạo prefix mới cho process (gọi lại trong worker sau fork)"""
+    global _request_counter, _request_id_prefix
+    _request_counter = itertools.count()
+    _request_id_prefix = f"{uuid.uuid4().hex[:6]}{os.getpid():x}"
+
+_reset_request_id_prefix()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_request_id_prefix)
+
+def new_request_id():
+    """Request ID duy nhất giữa các process, không trùng khi cùng IP/cùng millisecond"""
+    return f"{_request_id_prefix}-{next(_request_counter):x}"
+
+def _init_request_flags():
+    """Tính một lần các thông tin request mà nhiều after_request cần dùng"""
+    g.accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    g.is_get = request.method == 'GET'
+
+def request_flags():
+    """(accepts_gzip, is_get) của request hiện tại, tính lại nếu before_request bị bỏ qua"""
+    if 'is_get' not in g:
+        _init_request_flags()
+    return g.accepts_gzip, g.is_get
+
 class RequestLoggingMiddleware:
     """Middleware để log tất cả HTTP requests"""
     
@@ -14,17 +80,23 @@ class RequestLoggingMiddleware:
         if app is not None:
             self.init_app(app)
     
-    def init_app(self, app):
+    def init_app(self, app, after_request=True):
         """Initialize middleware với Flask app"""
+        # Chạy trước mọi before_request khác (kể cả rate limiter) để g luôn đủ field
+        app.before_request_funcs.setdefault(None, []).insert(0, self.init_request_context)
         app.before_request(self.before_request)
-        app.after_request(self.after_request)
+        if after_request:
+            app.after_request(self.after_request)
         app.teardown_appcontext(self.teardown_request)
     
-    def before_request(self):
-        """Ghi nhận thời gian bắt đầu request"""
+    def init_request_context(self):
+        """Khởi tạo start_time, request_id và request flags cho mọi request"""
         g.start_time = time.time()
-        g.request_id = f"{request.remote_addr}_{int(time.time() * 1000)}"
-        
+        g.request_id = new_request_id()
+        _init_request_flags()
+    
+    def before_request(self):
+        """Log request bắt đầu"""
         # Log request start
         performance_logger.logger.debug(
             "Request started",
@@ -39,31 +111,60 @@ class RequestLoggingMiddleware:
     
     def after_request(self, response):
         """Log request completion và performance metrics"""
-        if hasattr(g, 'start_time'):
-            duration = time.time() - g.start_time
-            
-            # Log request completion
-            request_logger.log_request(request, response, duration)
-            
-            # Log slow requests
-            if duration > 1.0:  # Requests slower than 1 second
-                performance_logger.logger.warning(
-                    "Slow request detected",
-                    extra={
-                        "request_id": getattr(g, 'request_id', 'unknown'),
-                        "method": request.method,
-                        "url": request.url,
-                        "duration_ms": round(duration * 1000, 2),
-                        "status_code": response.status_code
-                    }
-                )
-            
-            # Add performance headers
-            response.headers['X-Response-Time'] = f"{round(duration * 1000, 2)}ms"
-            response.headers['X-Request-ID'] = getattr(g, 'request_id', 'unknown')
+        duration = time.time() - g.start_time
+        
+        # Log request completion
+        request_logger.log_request(request, response, duration)
+        
+        # Endpoint đánh dấu bởi @log_api_call
+        view = current_app.view_functions.get(request.endpoint)
+        if view is not None and getattr(view, 'log_api_call', False):
+            self._log_api_call(response, duration)
+        
+        # Log slow requests
+        if duration > 1.0:  # Requests slower than 1 second
+            performance_logger.logger.warning(
+                "Slow request detected",
+                extra={
+                    "request_id": g.request_id,
+                    "method": request.method,
+                    "url": request.url,
+                    "duration_ms": round(duration * 1000, 2),
+                    "status_code": response.status_code
+                }
+            )
+        
+        # Add performance headers
+        response.headers['X-Response-Time'] = f"{round(duration * 1000, 2)}ms"
+        response.headers['X-Request-ID'] = g.request_id
         
         return response
     
+    def _log_api_call(self, response, duration):
+        """Log API call với cùng duration của request"""
+        if response.status_code >= 500:
+            performance_logger.logger.error(
+                f"API call failed: {request.endpoint}",
+                extra={
+                    "endpoint": request.endpoint,
+                    "method": request.method,
+                    "duration_ms": round(duration * 1000, 2),
+                    "status": "error",
+                    "status_code": response.status_code
+                }
+            )
+        else:
+            performance_logger.logger.info(
+                f"API call: {request.endpoint}",
+                extra={
+                    "endpoint": request.endpoint,
+                    "method": request.method,
+                    "duration_ms": round(duration * 1000, 2),
+                    "status": "success",
+                    "status_code": response.status_code
+                }
+            )
+    
     def teardown_request(self, exception=None):
         """Cleanup sau request"""
         if exception:
@@ -92,46 +193,62 @@ class RequestLoggingMiddleware:
 class CompressionMiddleware:
     """Middleware để compress API responses"""
     
-    def __init__(self, app=None, min_size=1024):
+    # Payload rất lớn: bandwidth đã được lợi nhiều, ưu tiên CPU bằng level 1
+    LARGE_PAYLOAD_SIZE = 1024 * 1024
+    
+    def __init__(self, app=None, min_size=2048, compresslevel=5):
         self.app = app
         self.min_size = min_size
+        self.compresslevel = compresslevel
         if app is not None:
             self.init_app(app)
     
-    def init_app(self, app):
+    def init_app(self, app, after_request=True):
         """Initialize compression middleware"""
-        app.after_request(self.compress_response)
+        if after_request:
+            app.after_request(self.compress_response)
     
     def compress_response(self, response):
         """Compress response nếu client hỗ trợ gzip"""
         
+        # Streaming/file responses hoặc body đã được encode: không đụng tới body
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        
         # Chỉ compress JSON responses
-        if (response.content_type and 
-            'application/json' in response.content_type and
-            len(response.data) > self.min_size):
+        if not (response.content_type and 'application/json' in response.content_type):
+            return response
+        
+        # Kiểm tra client có hỗ trợ gzip không
+        accepts_gzip, _ = request_flags()
+        if not accepts_gzip:
+            return response
+        
+        # Content-Length có sẵn thì loại response nhỏ trước khi đọc body
+        content_length = response.content_length
+        if content_length is not None and content_length <= self.min_size:
+            return response
+        
+        # response.data join lại body mỗi lần truy cập -> chỉ đọc một lần
+        data = response.get_data()
+        if len(data) <= self.min_size:
+            return response
+        
+        # Compress response data
+        compresslevel = 1 if len(data) > self.LARGE_PAYLOAD_SIZE else self.compresslevel
+        compressed_data = gzip_compress(data, compresslevel)
+        
+        # Chỉ sử dụng compressed version nếu nhỏ hơn
+        if len(compressed_data) < len(data):
+            # set_data tự cập nhật Content-Length
+            response.set_data(compressed_data)
+            response.headers['Content-Encoding'] = 'gzip'
             
-            # Kiểm tra client có hỗ trợ gzip không
-            accept_encoding = request.headers.get('Accept-Encoding', '')
-            if 'gzip' in accept_encoding.lower():
-                
-                # Compress response data
-                gzip_buffer = BytesIO()
-                with gzip.GzipFile(fileobj=gzip_buffer, mode='wb') as gzip_file:
-                    gzip_file.write(response.data)
-                
-                compressed_data = gzip_buffer.getvalue()
-                
-                # Chỉ sử dụng compressed version nếu nhỏ hơn
-                if len(compressed_data) < len(response.data):
-                    response.data = compressed_data
-                    response.headers['Content-Encoding'] = 'gzip'
-                    response.headers['Content-Length'] = len(compressed_data)
-                    
-                    # Log compression ratio
-                    ratio = len(compressed_data) / len(response.data) * 100
-                    performance_logger.logger.debug(
-                        f"Response compressed: {ratio:.1f}% of original size"
-                    )
+            # Log compression ratio
+            ratio = len(compressed_data) / len(data) * 100
+            performance_logger.logger.debug(
+                f"Response compressed: {ratio:.1f}% of original size"
+            )
         
         return response
 
@@ -173,34 +290,78 @@ class CacheControlMiddleware:
             '/api/active-streams': 60,  # Cache 1 minute
             '/api/detection-results': 120,  # Cache 2 minutes
         }
+        self._build_rule_index()
+        # cache_time -> (giây đã format, chuỗi Expires), chỉ format lại khi sang giây mới
+        self._expires_cache = {}
         if app is not None:
             self.init_app(app)
     
-    def init_app(self, app):
+    @staticmethod
+    def _bucket_key(path):
+        """Hai segment đầu của path, vd '/api/cameras/cam_1' -> '/api/cameras'"""
+        return '/'.join(path.split('/', 3)[:3])
+    
+    def _build_rule_index(self):
+        """Chia cache_rules theo bucket, mỗi bucket sắp xếp longest-match trước"""
+        buckets = {}
+        for rule, time_seconds in sorted(self.cache_rules.items(), key=lambda item: -len(item[0])):
+            buckets.setdefault(self._bucket_key(rule), []).append((rule, time_seconds))
+        self._rules_by_bucket = {key: tuple(rules) for key, rules in buckets.items()}
+    
+    def _find_cache_time(self, path):
+        """Tìm cache time cho path: một dict lookup + duyệt các rule cùng bucket"""
+        for rule, time_seconds in self._rules_by_bucket.get(self._bucket_key(path), ()):
+            if path.startswith(rule):
+                return time_seconds
+        return None
+    
+    def _expires_header(self, cache_time):
+        """Expires header cho cache_time, cache theo từng giây"""
+        now = int(time.time())
+        cached = self._expires_cache.get(cache_time)
+        if cached is None or cached[0] != now:
+            cached = (now, formatdate(now + cache_time, usegmt=True))
+            self._expires_cache[cache_time] = cached
+        return cached[1]
+    
+    @staticmethod
+    def _compute_etag(response):
+        """ETag theo nội dung ổn định của response
+        
+        create_api_response đặt timestamp/request_id (đổi mỗi request) ở cuối body và ghi
+        độ dài phần đứng trước vào g.etag_prefix_len: hash đúng các byte đã serialize,
+        không serialize lại payload. ETag là weak vì dùng chung cho cả bản gzip và bản gốc.
+        """
+        body = response.get_data()
+        prefix_len = g.get('etag_prefix_len')
+        if prefix_len is not None:
+            body = memoryview(body)[:prefix_len]
+        return hashlib.blake2b(body, digest_size=8).hexdigest()
+    
+    def init_app(self, app, after_request=True):
         """Initialize cache control middleware"""
-        app.after_request(self.add_cache_headers)
+        if after_request:
+            app.after_request(self.add_cache_headers)
     
     def add_cache_headers(self, response):
         """Add appropriate cache headers"""
         
         # Chỉ cache GET requests
-        if request.method == 'GET':
-            endpoint = request.endpoint
-            path = request.path
-            
+        _, is_get = request_flags()
+        if is_get:
             # Tìm cache time cho endpoint này
-            cache_time = None
-            for rule, time_seconds in self.cache_rules.items():
-                if path.startswith(rule):
-                    cache_time = time_seconds
-                    break
+            cache_time = self._find_cache_time(request.path)
             
             if cache_time and response.status_code == 200:
-                response.headers['Cache-Control'] = f'public, max-age={cache_time}'
-                response.headers['Expires'] = time.strftime(
-                    '%a, %d %b %Y %H:%M:%S GMT',
-                    time.gmtime(time.time() + cache_time)
-                )
+                # Shared cache (CDN/proxy) giữ cache_time, browser luôn revalidate bằng ETag
+                response.headers['Cache-Control'] = f'public, s-maxage={cache_time}, max-age=0'
+                response.headers['CDN-Cache-Control'] = f'max-age={cache_time}'
+                # Shared cache phải tách bản gzip và bản gốc
+                response.vary.add('Accept-Encoding')
+                response.set_etag(self._compute_etag(response), weak=True)
+                response.headers['Expires'] = self._expires_header(cache_time)
+                # If-None-Match khớp -> 304 không body, bỏ qua luôn bước compress
+                response.make_conditional(request)
             else:
                 # No cache cho sensitive endpoints
                 response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -212,36 +373,70 @@ class CacheControlMiddleware:
 class SecurityHeadersMiddleware:
     """Middleware để thêm security headers"""
     
+    # Headers cố định, build một lần và extend vào mọi response
+    STATIC_HEADERS = (
+        # Content Security Policy
+        ('Content-Security-Policy', (
+            "default-src 'self'; "
+            "script-src 'self' 'unsafe-inline'; "
+            "style-src 'self' 'unsafe-inline'; "
+            "img-src 'self' data:; "
+            "connect-src 'self'"
+        )),
+        # Other security headers
+        ('X-Content-Type-Options', 'nosniff'),
+        ('X-Frame-Options', 'DENY'),
+        ('X-XSS-Protection', '1; mode=block'),
+        ('Strict-Transport-Security', 'max-age=31536000; includeSubDomains'),
+        ('Referrer-Policy', 'strict-origin-when-cross-origin'),
+    )
+    
     def __init__(self, app=None):
         self.app = app
         if app is not None:
             self.init_app(app)
     
-    def init_app(self, app):
+    def init_app(self, app, after_request=True):
         """Initialize security headers middleware"""
-        app.after_request(self.add_security_headers)
+        if after_request:
+            app.after_request(self.add_security_headers)
     
     def add_security_headers(self, response):
         """Add security headers to all responses"""
-        
-        # Content Security Policy
-        response.headers['Content-Security-Policy'] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "img-src 'self' data:; "
-            "connect-src 'self'"
-        )
-        
-        # Other security headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        
+        # Không handler nào khác set các header này nên extend không tạo trùng lặp
+        response.headers.extend(self.STATIC_HEADERS)
         return response
 
+class CombinedResponseMiddleware:
+    """Gộp after_request của các response middleware thành một callback duy nhất
+    
+    Thứ tự giữ như khi đăng ký riêng lẻ: security -> cache headers -> compression
+    -> request logging (log cuối để đo đủ thời gian, kể cả compress).
+    """
+    
+    def __init__(self, app=None, request_logging=None, compression=None,
+                 cache_control=None, security_headers=None):
+        self.request_logging = request_logging or RequestLoggingMiddleware()
+        self.compression = compression or CompressionMiddleware()
+        self.cache_control = cache_control or CacheControlMiddleware()
+        self.security_headers = security_headers or SecurityHeadersMiddleware()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize các middleware con, chỉ đăng ký một after_request"""
+        self.request_logging.init_app(app, after_request=False)
+        self.compression.init_app(app, after_request=False)
+        self.cache_control.init_app(app, after_request=False)
+        self.security_headers.init_app(app, after_request=False)
+        app.after_request(self.after_request)
+    
+    def after_request(self, response):
+        response = self.security_headers.add_security_headers(response)
+        response = self.cache_control.add_cache_headers(response)
+        response = self.compression.compress_response(response)
+        return self.request_logging.after_request(response)
+
 # Decorators cho API optimization
 def require_json(f):
     """Decorator yêu cầu request phải có Content-Type: application/json"""
@@ -257,19 +452,32 @@ def require_json(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Body lỗi pagination serialize sẵn một lần lúc import
+_BAD_PAGE_BODY = orjson.dumps({"error": "Page phải >= 1"}, option=orjson.OPT_APPEND_NEWLINE)
+_BAD_PER_PAGE_BODY = orjson.dumps({"error": "Per_page phải từ 1-100"}, option=orjson.OPT_APPEND_NEWLINE)
+
+def _int_arg(name, default):
+    """Parse int query arg: fast path cho chuỗi chữ số, còn lại giữ semantics của type=int"""
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    if raw.isdecimal():
+        return int(raw)
+    return request.args.get(name, default, type=int)
+
 def validate_pagination(f):
     """Decorator để validate pagination parameters"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = _int_arg('page', 1)
+        per_page = _int_arg('per_page', 20)
         
         # Validate pagination
         if page < 1:
-            return jsonify({"error": "Page phải >= 1"}), 400
+            return current_app.response_class(_BAD_PAGE_BODY, 400, mimetype='application/json')
         
         if per_page < 1 or per_page > 100:
-            return jsonify({"error": "Per_page phải từ 1-100"}), 400
+            return current_app.response_class(_BAD_PER_PAGE_BODY, 400, mimetype='application/json')
         
         # Add to kwargs
         kwargs['page'] = page
@@ -279,92 +487,55 @@ def validate_pagination(f):
     return decorated_function
 
 def log_api_call(f):
-    """Decorator để log API calls với details"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        start_time = time.time()
-        
-        try:
-            result = f(*args, **kwargs)
-            duration = time.time() - start_time
-            
-            # Log successful API call
-            performance_logger.logger.info(
-                f"API call: {request.endpoint}",
-                extra={
-                    "endpoint": request.endpoint,
-                    "method": request.method,
-                    "duration_ms": round(duration * 1000, 2),
-                    "status": "success",
-                    "args_count": len(args),
-                    "kwargs_count": len(kwargs)
-                }
-            )
-            
-            return result
-            
-        except Exception as e:
-            duration = time.time() - start_time
-            
-            # Log failed API call
-            performance_logger.logger.error(
-                f"API call failed: {request.endpoint}",
-                extra={
-                    "endpoint": request.endpoint,
-                    "method": request.method,
-                    "duration_ms": round(duration * 1000, 2),
-                    "status": "error",
-                    "error": str(e)
-                },
-                exc_info=True
-            )
-            
-            raise
+    """Đánh dấu endpoint cần log API call
     
-    return decorated_function
+    Không bọc function: RequestLoggingMiddleware.after_request log API call
+    dùng chung duration với request log (tính từ g.start_time).
+    """
+    f.log_api_call = True
+    return f
 
 # Response helpers
 def create_paginated_response(items, page, per_page, total_count, endpoint=None):
     """Tạo standardized paginated response"""
     
     pages = (total_count + per_page - 1) // per_page
+    has_prev = page > 1
+    has_next = page < pages
     
-    response = {
-        "data": items,
-        "pagination": {
-            "page": page,
-            "per_page": per_page,
-            "total": total_count,
-            "pages": pages,
-            "has_prev": page > 1,
-            "has_next": page < pages
-        }
+    pagination = {
+        "page": page,
+        "per_page": per_page,
+        "total": total_count,
+        "pages": pages,
+        "has_prev": has_prev,
+        "has_next": has_next
     }
     
     # Add navigation links nếu có endpoint
     if endpoint:
-        response["pagination"]["links"] = {
-            "self": f"{endpoint}?page={page}&per_page={per_page}",
-            "first": f"{endpoint}?page=1&per_page={per_page}",
-            "last": f"{endpoint}?page={pages}&per_page={per_page}"
+        # Prefix chung của mọi link, chỉ khác số trang
+        base = f"{endpoint}?per_page={per_page}&page="
+        links = {
+            "self": base + str(page),
+            "first": base + "1",
+            "last": base + str(pages)
         }
         
-        if page > 1:
-            response["pagination"]["links"]["prev"] = f"{endpoint}?page={page-1}&per_page={per_page}"
+        if has_prev:
+            links["prev"] = base + str(page - 1)
         
-        if page < pages:
-            response["pagination"]["links"]["next"] = f"{endpoint}?page={page+1}&per_page={per_page}"
+        if has_next:
+            links["next"] = base + str(page + 1)
+        
+        pagination["links"] = links
     
-    return response
+    return {"data": items, "pagination": pagination}
 
 def create_api_response(data=None, message=None, status="success", code=200, **kwargs):
     """Tạo standardized API response format"""
     
-    response = {
-        "status": status,
-        "timestamp": time.time(),
-        "request_id": getattr(g, 'request_id', 'unknown')
-    }
+    response = {"status": status}
     
     if data is not None:
         response["data"] = data
@@ -375,4 +546,17 @@ def create_api_response(data=None, message=None, status="success", code=200, **k
     # Thêm extra fields
     response.update(kwargs)
     
-    return jsonify(response), code 
\ No newline at end of file
+    # Serialize một lần; timestamp/request_id (đổi mỗi request) nối vào cuối object để
+    # phần đứng trước ổn định -> ETag hash thẳng trên các byte này
+    body = orjson.dumps(response, default=str, option=orjson.OPT_NON_STR_KEYS)
+    volatile = {
+        key: value for key, value in (
+            ("timestamp", time.time()),
+            ("request_id", getattr(g, 'request_id', 'unknown'))
+        ) if key not in response
+    }
+    g.etag_prefix_len = len(body) - 1
+    if volatile:
+        body = body[:-1] + b',' + orjson.dumps(volatile)[1:]
+    
+    return current_app.response_class(body + b'\n', mimetype='application/json'), code
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""Store detection_schedules.camera_ids as native JSON
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-01-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Dữ liệu cũ là JSON text hợp lệ -> cast trực tiếp sang JSONB
+        op.alter_column('detection_schedules', 'camera_ids',
+            existing_type=sa.Text(),
+            type_=postgresql.JSONB(),
+            existing_nullable=False,
+            postgresql_using='camera_ids::jsonb'
+        )
+    else:
+        # SQLite: JSON lưu dạng TEXT (JSON1), dữ liệu cũ giữ nguyên
+        with op.batch_alter_table('detection_schedules') as batch_op:
+            batch_op.alter_column('camera_ids',
+                existing_type=sa.Text(),
+                type_=sa.JSON(),
+                existing_nullable=False
+            )
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.alter_column('detection_schedules', 'camera_ids',
+            existing_type=postgresql.JSONB(),
+            type_=sa.Text(),
+            existing_nullable=False,
+            postgresql_using='camera_ids::text'
+        )
+    else:
+        with op.batch_alter_table('detection_schedules') as batch_op:
+            batch_op.alter_column('camera_ids',
+                existing_type=sa.JSON(),
+                type_=sa.Text(),
+                existing_nullable=False
+            )
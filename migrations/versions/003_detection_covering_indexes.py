@@ -0,0 +1,36 @@
+"""Covering indexes for paginated detection listings
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-01-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # (camera_id, timestamp DESC) + INCLUDE các cột của to_dict() -> index-only scan trên Postgres
+    # (postgresql_include bị bỏ qua trên SQLite)
+    op.create_index('idx_detections_camera_ts_cover', 'detections',
+        ['camera_id', sa.text('timestamp DESC')],
+        postgresql_include=['image_path', 'faces_count', 'schedule_id', 'test_mode', 'real_camera']
+    )
+    op.create_index('idx_detections_schedule_ts', 'detections',
+        ['schedule_id', sa.text('timestamp DESC')]
+    )
+    
+    # Đã được các composite index mới bao phủ (cùng cột đầu)
+    op.drop_index('idx_camera_timestamp', table_name='detections')
+    op.drop_index('idx_schedule', table_name='detections')
+
+def downgrade():
+    op.create_index('idx_schedule', 'detections', ['schedule_id'])
+    op.create_index('idx_camera_timestamp', 'detections', ['camera_id', 'timestamp'])
+    op.drop_index('idx_detections_schedule_ts', table_name='detections')
+    op.drop_index('idx_detections_camera_ts_cover', table_name='detections')
@@ -0,0 +1,61 @@
+"""Store detections.timestamp as TIMESTAMPTZ with a BRIN index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-01-25 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Rewrite tại chỗ, các btree index trên timestamp được rebuild tự động
+        op.alter_column('detections', 'timestamp',
+            existing_type=sa.Integer(),
+            type_=sa.DateTime(timezone=True),
+            existing_nullable=False,
+            postgresql_using='to_timestamp("timestamp")'
+        )
+        # Detections insert theo thứ tự thời gian -> BRIN rất nhỏ cho range query
+        op.create_index('idx_detections_ts_brin', 'detections', ['timestamp'],
+            postgresql_using='brin',
+            postgresql_with={'pages_per_range': 32}
+        )
+    else:
+        # SQLite: convert Unix seconds sang chuỗi datetime UTC mà SQLAlchemy DateTime đọc được
+        op.execute("UPDATE detections SET timestamp = datetime(timestamp, 'unixepoch')")
+        with op.batch_alter_table('detections') as batch_op:
+            batch_op.alter_column('timestamp',
+                existing_type=sa.Integer(),
+                type_=sa.DateTime(timezone=True),
+                existing_nullable=False
+            )
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.drop_index('idx_detections_ts_brin', table_name='detections')
+        op.alter_column('detections', 'timestamp',
+            existing_type=sa.DateTime(timezone=True),
+            type_=sa.Integer(),
+            existing_nullable=False,
+            postgresql_using='extract(epoch from "timestamp")::integer'
+        )
+    else:
+        op.execute("UPDATE detections SET timestamp = CAST(strftime('%s', timestamp) AS INTEGER)")
+        with op.batch_alter_table('detections') as batch_op:
+            batch_op.alter_column('timestamp',
+                existing_type=sa.DateTime(timezone=True),
+                type_=sa.Integer(),
+                existing_nullable=False
+            )
@@ -0,0 +1,40 @@
+"""ON DELETE CASCADE for detections/stream_sessions -> cameras
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# FK ở 001 không đặt tên: Postgres tự đặt <table>_<column>_fkey,
+# SQLite (batch mode, reflect lại bảng) cần naming convention để tìm constraint
+_SQLITE_NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+_TABLES = ('detections', 'stream_sessions')
+
+def _recreate_fks(ondelete):
+    bind = op.get_bind()
+
+    for table in _TABLES:
+        if bind.dialect.name == 'postgresql':
+            name = f'{table}_camera_id_fkey'
+            op.drop_constraint(name, table, type_='foreignkey')
+            op.create_foreign_key(name, table, 'cameras', ['camera_id'], ['id'], ondelete=ondelete)
+        else:
+            name = f'fk_{table}_camera_id_cameras'
+            with op.batch_alter_table(table, naming_convention=_SQLITE_NAMING) as batch_op:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, 'cameras', ['camera_id'], ['id'], ondelete=ondelete)
+
+def upgrade():
+    # Xóa camera = một DELETE, DB tự xóa detections/stream sessions liên quan
+    _recreate_fks('CASCADE')
+
+def downgrade():
+    _recreate_fks(None)
@@ -1,9 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import json
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+from datetime import datetime, timezone
+import calendar
 
 db = SQLAlchemy()
 
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite mặc định không enforce FK -> bật để ON DELETE CASCADE có hiệu lực"""
+    if type(dbapi_connection).__module__.startswith('sqlite3'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+class UnixTimestamp(TypeDecorator):
+    """Cột TIMESTAMPTZ trong DB, phía Python vẫn là Unix seconds (int)"""
+    impl = db.DateTime(timezone=True)
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.fromtimestamp(value, timezone.utc)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # SQLite trả về datetime naive (đã là UTC)
+        return calendar.timegm(value.utctimetuple())
+
+def _iso(dt):
+    """ISO format cho DateTime column (None nếu chưa có giá trị)"""
+    return dt.isoformat() if dt else None
+
 class Camera(db.Model):
     """Model cho camera"""
     __tablename__ = 'cameras'
@@ -16,8 +48,8 @@ class Camera(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    detections = db.relationship('Detection', backref='camera', lazy='dynamic', cascade='all, delete-orphan')
+    # Relationships (xóa con do ON DELETE CASCADE trong DB, ORM không load từng dòng để xóa)
+    detections = db.relationship('Detection', backref='camera', lazy='dynamic', passive_deletes=True)
     
     def __repr__(self):
         return f'<Camera {self.id}: {self.name}>'
@@ -30,8 +62,8 @@ class Camera(db.Model):
             'ip': self.ip,
             'location': self.location,
             'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': _iso(self.created_at),
+            'updated_at': _iso(self.updated_at)
         }
     
     @staticmethod
@@ -51,8 +83,8 @@ class Detection(db.Model):
     __tablename__ = 'detections'
     
     id = db.Column(db.Integer, primary_key=True)
-    camera_id = db.Column(db.String(50), db.ForeignKey('cameras.id'), nullable=False)
-    timestamp = db.Column(db.Integer, nullable=False)
+    camera_id = db.Column(db.String(50), db.ForeignKey('cameras.id', ondelete='CASCADE'), nullable=False)
+    timestamp = db.Column(UnixTimestamp(), nullable=False)
     image_path = db.Column(db.String(255), nullable=False)
     faces_count = db.Column(db.Integer, default=0)
     test_mode = db.Column(db.Boolean, default=False)
@@ -60,18 +92,26 @@ class Detection(db.Model):
     schedule_id = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Indexes for better performance
+    # Indexes for better performance (composite indexes khai báo sau class;
+    # BRIN idx_detections_ts_brin cho range query chỉ tạo trên Postgres, xem migration 004)
     __table_args__ = (
-        db.Index('idx_camera_timestamp', 'camera_id', 'timestamp'),
         db.Index('idx_timestamp', 'timestamp'),
-        db.Index('idx_schedule', 'schedule_id'),
     )
     
     def __repr__(self):
         return f'<Detection {self.id}: {self.camera_id} at {self.timestamp}>'
     
-    def to_dict(self):
-        """Convert to dictionary"""
+    def to_dict(self, camera_info_by_id=None):
+        """Convert to dictionary
+        
+        camera_info_by_id: dict camera_id -> camera dict đã lấy sẵn, tránh lazy load
+        camera cho từng detection khi serialize cả trang (N+1).
+        """
+        if camera_info_by_id is not None:
+            camera_info = camera_info_by_id.get(self.camera_id, {})
+        else:
+            camera_info = self.camera.to_dict() if self.camera else {}
+        
         return {
             'id': self.id,
             'camera_id': self.camera_id,
@@ -81,16 +121,26 @@ class Detection(db.Model):
             'test_mode': self.test_mode,
             'real_camera': self.real_camera,
             'schedule_id': self.schedule_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'camera_info': self.camera.to_dict() if self.camera else {}
+            'created_at': _iso(self.created_at),
+            'camera_info': camera_info
         }
 
+# Listing theo camera: covering index trên Postgres (INCLUDE) -> index-only scan, không đọc heap
+db.Index(
+    'idx_detections_camera_ts_cover',
+    Detection.camera_id, Detection.timestamp.desc(),
+    postgresql_include=['image_path', 'faces_count', 'schedule_id', 'test_mode', 'real_camera']
+)
+
+# Listing theo schedule, đã sắp xếp theo thời gian
+db.Index('idx_detections_schedule_ts', Detection.schedule_id, Detection.timestamp.desc())
+
 class StreamSession(db.Model):
     """Model cho tracking stream sessions"""
     __tablename__ = 'stream_sessions'
     
     id = db.Column(db.Integer, primary_key=True)
-    camera_id = db.Column(db.String(50), db.ForeignKey('cameras.id'), nullable=False)
+    camera_id = db.Column(db.String(50), db.ForeignKey('cameras.id', ondelete='CASCADE'), nullable=False)
     session_id = db.Column(db.String(100), nullable=False)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     ended_at = db.Column(db.DateTime, nullable=True)
@@ -104,8 +154,8 @@ class StreamSession(db.Model):
             'id': self.id,
             'camera_id': self.camera_id,
             'session_id': self.session_id,
-            'started_at': self.started_at.isoformat() if self.started_at else None,
-            'ended_at': self.ended_at.isoformat() if self.ended_at else None,
+            'started_at': _iso(self.started_at),
+            'ended_at': _iso(self.ended_at),
             'status': self.status
         }
 
@@ -114,7 +164,8 @@ class DetectionSchedule(db.Model):
     __tablename__ = 'detection_schedules'
     
     id = db.Column(db.String(100), primary_key=True)
-    camera_ids = db.Column(db.Text, nullable=False)  # JSON string of camera IDs
+    # List camera IDs: JSONB trên Postgres, JSON1 trên SQLite - driver parse sẵn thành list
+    camera_ids = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
     duration = db.Column(db.Integer, nullable=False)  # in minutes
     status = db.Column(db.String(20), default='active')  # active, completed, cancelled
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
@@ -126,14 +177,11 @@ class DetectionSchedule(db.Model):
     
     def get_camera_ids(self):
         """Get camera IDs as list"""
-        try:
-            return json.loads(self.camera_ids)
-        except:
-            return []
+        return self.camera_ids or []
     
     def set_camera_ids(self, camera_list):
         """Set camera IDs from list"""
-        self.camera_ids = json.dumps(camera_list)
+        self.camera_ids = list(camera_list)
     
     def to_dict(self):
         return {
@@ -141,7 +189,7 @@ class DetectionSchedule(db.Model):
             'camera_ids': self.get_camera_ids(),
             'duration': self.duration,
             'status': self.status,
-            'start_time': self.start_time.isoformat() if self.start_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'start_time': _iso(self.start_time),
+            'end_time': _iso(self.end_time),
+            'created_at': _iso(self.created_at)
         } 
\ No newline at end of file
@@ -4,87 +4,139 @@ Performance testing script for StreamCameraSecurity
 Tests database, cache, and API performance
 """
 
-import requests
+import asyncio
+import httpx
+import multiprocessing
 import time
-import concurrent.futures
 import statistics
-import json
-import random
-from typing import List, Dict, Any
+from collections import Counter
+import numpy as np
+from hdrh.histogram import HdrHistogram
+import orjson
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any, Union
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Side-effect-free GET used to open pooled connections before timing
+WARMUP_ENDPOINT = "/api/health"
+
+# wrk (C load generator) for GET throughput phases, if installed
+WRK_PATH = shutil.which("wrk")
+WRK_DURATION = 10  # seconds per endpoint
+_WRK_UNITS = {"us": 1e-6, "ms": 1e-3, "s": 1.0, "m": 60.0}
+
+def _parse_wrk_duration(value: str) -> float:
+    """Convert a wrk duration such as '1.23ms' to seconds"""
+    number, unit = re.fullmatch(r"([\d.]+)(us|ms|s|m)", value).groups()
+    return float(number) * _WRK_UNITS[unit]
+
+# Latency histogram range: 1µs .. 60s, 3 significant digits
+HIST_ARGS = (1, 60_000_000, 3)
+
+# Per-process tester used by multiprocessing workers (own client + event loop)
+_worker_tester = None
+
+def _init_worker(base_url: str, max_concurrency: int, read_body: bool):
+    global _worker_tester
+    _worker_tester = PerformanceTest(base_url, max_concurrency, read_body)
+
+def _run_partition(url: str, method: str, data, concurrent_requests: int, total_requests: int):
+    """Run one worker's share of an endpoint test, return (encoded histogram, errors, total_time)"""
+    hist = HdrHistogram(*HIST_ARGS)
+    errors, total_time = _worker_tester.run_async(
+        _worker_tester._drive(url, method, data, concurrent_requests, total_requests, hist)
+    )
+    return hist.encode(), errors, total_time
 
 class PerformanceTest:
-    def __init__(self, base_url: str = "http://localhost:5000"):
+    def __init__(self, base_url: str = "http://localhost:5000", max_concurrency: int = 64,
+                 read_body: bool = False, worker_count: int = 1):
         self.base_url = base_url
-        self.session = requests.Session()
+        # False: timing-only mode, latency measured at response headers and body discarded
+        self.read_body = read_body
+        
+        # Async client bound to one long-lived loop. HTTP/2 is only negotiated via TLS ALPN,
+        # so it is enabled for https:// targets only; plaintext targets (the Flask/Socket.IO
+        # server) speak HTTP/1.1. Keep-alive pool as large as the connection limit so warmed
+        # sockets are not dropped, and idle sockets kept for 75s (httpx default 5s) so they
+        # survive gaps between phases
+        self.loop = asyncio.new_event_loop()
+        max_connections = max(max_concurrency, 100)
+        self.client = httpx.AsyncClient(
+            http2=base_url.startswith("https://"),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=75
+            )
+        )
+        
+        # Client processes for the Python load path, created once (before any event loop
+        # runs) and reused by every endpoint test
+        self.worker_count = worker_count
+        self.pool = None
+        if worker_count > 1:
+            self.pool = multiprocessing.Pool(
+                worker_count, initializer=_init_worker,
+                initargs=(base_url, max_concurrency, read_body)
+            )
         self.results = {}
     
-    def test_api_endpoint(self, endpoint: str, method: str = "GET", data: Dict = None, 
+    def test_api_endpoint(self, endpoint: str, method: str = "GET", data: Union[Dict, List[Dict]] = None, 
                          concurrent_requests: int = 10, total_requests: int = 100) -> Dict[str, Any]:
-        """Test API endpoint performance"""
+        """Test API endpoint performance (sync wrapper)"""
+        return self.run_async(self.test_api_endpoint_async(
+            endpoint, method, data, concurrent_requests, total_requests
+        ))
+    
+    async def test_api_endpoint_async(self, endpoint: str, method: str = "GET", data: Union[Dict, List[Dict]] = None, 
+                                      concurrent_requests: int = 10, total_requests: int = 100) -> Dict[str, Any]:
+        """Test API endpoint performance
+        
+        data may be a list of payloads: request i sends data[i % len(data)].
+        """
         print(f"\n🧪 Testing {method} {endpoint}")
         print(f"   Concurrent requests: {concurrent_requests}")
         print(f"   Total requests: {total_requests}")
         
-        url = f"{self.base_url}{endpoint}"
-        response_times = []
-        errors = 0
-        
-        def make_request():
-            start_time = time.time()
-            try:
-                if method == "GET":
-                    response = self.session.get(url)
-                elif method == "POST":
-                    response = self.session.post(url, json=data)
-                elif method == "PUT":
-                    response = self.session.put(url, json=data)
-                else:
-                    raise ValueError(f"Unsupported method: {method}")
-                
-                response.raise_for_status()
-                return time.time() - start_time
-            except Exception as e:
-                print(f"   ❌ Request failed: {e}")
-                return None
-        
-        # Warm up
-        for _ in range(5):
-            make_request()
-        
-        # Performance test
-        start_total = time.time()
+        if method not in ("GET", "POST", "PUT"):
+            raise ValueError(f"Unsupported method: {method}")
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-            futures = [executor.submit(make_request) for _ in range(total_requests)]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    response_times.append(result)
-                else:
-                    errors += 1
+        url = f"{self.base_url}{endpoint}"
         
-        total_time = time.time() - start_total
+        # Latencies in microseconds, O(1) memory per endpoint
+        hist = HdrHistogram(*HIST_ARGS)
         
-        if response_times:
-            avg_response_time = statistics.mean(response_times)
-            median_response_time = statistics.median(response_times)
-            p95_response_time = sorted(response_times)[int(len(response_times) * 0.95)]
-            requests_per_second = len(response_times) / total_time
+        if self.pool is None:
+            # All requests share a single event loop thread
+            errors, total_time = await self._drive(url, method, data, concurrent_requests, total_requests, hist)
+        else:
+            errors, total_time = await self._drive_workers(url, method, data, concurrent_requests, total_requests, hist)
+        successful_requests = hist.get_total_count()
+        
+        if successful_requests:
+            # Convert to seconds only for the report
+            avg_response_time = hist.get_mean_value() / 1e6
+            median_response_time = hist.get_value_at_percentile(50) / 1e6
+            p95_response_time = hist.get_value_at_percentile(95) / 1e6
+            requests_per_second = successful_requests / total_time
             
             result = {
                 "endpoint": endpoint,
                 "method": method,
                 "total_requests": total_requests,
-                "successful_requests": len(response_times),
+                "successful_requests": successful_requests,
                 "errors": errors,
                 "total_time": total_time,
                 "avg_response_time": avg_response_time,
                 "median_response_time": median_response_time,
                 "p95_response_time": p95_response_time,
                 "requests_per_second": requests_per_second,
-                "min_response_time": min(response_times),
-                "max_response_time": max(response_times)
+                "min_response_time": hist.get_min_value() / 1e6,
+                "max_response_time": hist.get_max_value() / 1e6
             }
             
             print(f"   ✅ Avg response time: {avg_response_time:.3f}s")
@@ -103,122 +155,332 @@ class PerformanceTest:
                 "successful_requests": 0
             }
     
-    def test_database_performance(self):
+    def _run_wrk(self, endpoint: str, duration: int, concurrency: int) -> Dict[str, Any]:
+        """Run wrk against a GET endpoint and parse latency / throughput from its output"""
+        url = f"{self.base_url}{endpoint}"
+        threads = min(8, concurrency)
+        proc = subprocess.run(
+            [WRK_PATH, f"-t{threads}", f"-c{concurrency}", f"-d{duration}s", "--latency", url],
+            capture_output=True, text=True, check=True
+        )
+        out = proc.stdout
+        
+        latency = re.search(r"Latency\s+(\S+)\s+\S+\s+(\S+)", out)
+        percentiles = dict(re.findall(r"^\s+(50|75|90|99)%\s+(\S+)", out, re.MULTILINE))
+        total = re.search(r"(\d+) requests in ([\d.]+\w+)", out)
+        rps = re.search(r"Requests/sec:\s+([\d.]+)", out)
+        non_2xx = re.search(r"Non-2xx or 3xx responses: (\d+)", out)
+        socket_errors = re.search(r"Socket errors: connect (\d+), read (\d+), write (\d+), timeout (\d+)", out)
+        
+        total_requests = int(total.group(1))
+        errors = int(non_2xx.group(1)) if non_2xx else 0
+        if socket_errors:
+            errors += sum(int(n) for n in socket_errors.groups())
+        
+        return {
+            "endpoint": endpoint,
+            "method": "GET",
+            "tool": "wrk",
+            "total_requests": total_requests,
+            "successful_requests": max(total_requests - errors, 0),
+            "errors": errors,
+            "total_time": _parse_wrk_duration(total.group(2)),
+            "avg_response_time": _parse_wrk_duration(latency.group(1)),
+            "median_response_time": _parse_wrk_duration(percentiles["50"]),
+            "p90_response_time": _parse_wrk_duration(percentiles["90"]),
+            "p99_response_time": _parse_wrk_duration(percentiles["99"]),
+            "max_response_time": _parse_wrk_duration(latency.group(2)),
+            "requests_per_second": float(rps.group(1))
+        }
+    
+    async def test_get_throughput(self, endpoint: str, concurrent_requests: int = 10,
+                                  total_requests: int = 100) -> Dict[str, Any]:
+        """GET throughput test: wrk when available, otherwise the Python client"""
+        if WRK_PATH is None:
+            return await self.test_api_endpoint_async(
+                endpoint, concurrent_requests=concurrent_requests, total_requests=total_requests
+            )
+        
+        print(f"\n🧪 Testing GET {endpoint} with wrk ({WRK_DURATION}s, {concurrent_requests} connections)")
+        result = await asyncio.to_thread(self._run_wrk, endpoint, WRK_DURATION, concurrent_requests)
+        print(f"   ✅ Avg response time: {result['avg_response_time']:.3f}s")
+        print(f"   📊 Median: {result['median_response_time']:.3f}s | P99: {result['p99_response_time']:.3f}s")
+        print(f"   🚀 Requests/sec: {result['requests_per_second']:.1f}")
+        print(f"   ❌ Errors: {result['errors']}")
+        return result
+    
+    def run_async(self, coro):
+        """Sync shim: run a coroutine on the tester's event loop"""
+        return self.loop.run_until_complete(coro)
+    
+    def close(self):
+        """Close the HTTP clients, worker processes and the event loop"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        self.run_async(self.client.aclose())
+        self.loop.close()
+    
+    async def _make_request(self, request: httpx.Request):
+        """Send one prebuilt request, return response time in nanoseconds or None on failure"""
+        start_ns = time.perf_counter_ns()
+        try:
+            response = await self.client.send(request, stream=True)
+            try:
+                response.raise_for_status()
+                if self.read_body:
+                    await response.aread()
+                    return time.perf_counter_ns() - start_ns
+                
+                latency_ns = time.perf_counter_ns() - start_ns
+                # Drain raw chunks (no decode/join) so the connection can be reused
+                async for _ in response.aiter_raw():
+                    pass
+                return latency_ns
+            finally:
+                await response.aclose()
+        except Exception as e:
+            print(f"   ❌ Request failed: {e}")
+            return None
+    
+    async def _drive_workers(self, url: str, method: str, data: Union[Dict, List[Dict]],
+                             concurrent_requests: int, total_requests: int, hist: HdrHistogram):
+        """Split the test across worker processes and merge their histograms"""
+        workers = min(self.worker_count, total_requests)
+        base, extra = divmod(total_requests, workers)
+        concurrency = max(concurrent_requests // workers, 1)
+        partitions = []
+        start = 0
+        for i in range(workers):
+            count = base + (1 if i < extra else 0)
+            # Each worker gets the payloads of its own contiguous range of request indices
+            # (global request j still sends data[j % len(data)]), so workers don't all
+            # replay the first payloads, e.g. duplicate camera IPs in the CRUD phase
+            if isinstance(data, list):
+                worker_data = [data[(start + k) % len(data)] for k in range(min(count, len(data)))]
+            else:
+                worker_data = data
+            partitions.append((url, method, worker_data, concurrency, count))
+            start += count
+        
+        results = await asyncio.to_thread(self.pool.starmap, _run_partition, partitions)
+        
+        errors = 0
+        total_time = 0.0
+        for encoded, worker_errors, worker_time in results:
+            hist.decode_and_add(encoded)
+            errors += worker_errors
+            # Workers run in parallel: wall time is the slowest worker
+            total_time = max(total_time, worker_time)
+        return errors, total_time
+    
+    async def _drive(self, url: str, method: str, data: Union[Dict, List[Dict]],
+                     concurrent_requests: int, total_requests: int, hist: HdrHistogram):
+        """Run total_requests requests with at most concurrent_requests in flight
+        
+        Successful latencies are recorded into hist; returns (errors, total_time).
+        """
+        errors = 0
+        payloads = data if isinstance(data, list) else [data]
+        # Build each request once (payload serialized, URL parsed, headers merged)
+        # and resend the same httpx.Request objects in the hot loop
+        prepared = [
+            self.client.build_request(method, url, content=orjson.dumps(p), headers=JSON_HEADERS)
+            if p is not None else self.client.build_request(method, url)
+            for p in payloads
+        ]
+        
+        # Fixed pool of concurrent_requests workers pulling request indices from a
+        # shared iterator: no per-request task or semaphore wake-up
+        indices = iter(range(total_requests))
+        
+        async def worker():
+            nonlocal errors
+            for i in indices:
+                latency_ns = await self._make_request(prepared[i % len(prepared)])
+                if latency_ns is None:
+                    errors += 1
+                else:
+                    hist.record_value(max(latency_ns // 1000, 1))
+        
+        # Warm up: open concurrent_requests connections in parallel so the pool
+        # is at steady-state size before timing. Uses the health endpoint, not the
+        # endpoint under test, so POST-only routes don't get 405s and no
+        # warm-up request hits the endpoint's own rate limit or side effects
+        warmup_url = f"{self.base_url}{WARMUP_ENDPOINT}"
+        await asyncio.gather(
+            *(self.client.get(warmup_url) for _ in range(concurrent_requests)),
+            return_exceptions=True
+        )
+        
+        # Performance test
+        start_total = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrent_requests, total_requests))))
+        total_time = time.perf_counter() - start_total
+        
+        return errors, total_time
+    
+    async def test_database_performance(self) -> Dict[str, Any]:
         """Test database operations performance"""
         print("\n📊 Testing Database Performance")
+        results = {}
         
         # Test camera listing (with cache)
-        self.results["get_cameras_cached"] = self.test_api_endpoint(
+        results["get_cameras_cached"] = await self.test_get_throughput(
             "/api/cameras", concurrent_requests=20, total_requests=200
         )
         
         # Test camera listing (cache miss simulation by adding query param)
-        self.results["get_cameras_no_cache"] = self.test_api_endpoint(
+        results["get_cameras_no_cache"] = await self.test_get_throughput(
             f"/api/cameras?_={int(time.time())}", concurrent_requests=5, total_requests=50
         )
         
         # Test detection results with pagination
-        self.results["get_detections_page1"] = self.test_api_endpoint(
+        results["get_detections_page1"] = await self.test_get_throughput(
             "/api/detection-results?page=1", concurrent_requests=10, total_requests=100
         )
         
-        self.results["get_detections_page2"] = self.test_api_endpoint(
+        results["get_detections_page2"] = await self.test_get_throughput(
             "/api/detection-results?page=2", concurrent_requests=10, total_requests=100
         )
+        
+        return results
     
-    def test_cache_performance(self):
+    async def test_cache_performance(self) -> Dict[str, Any]:
         """Test Redis cache performance"""
         print("\n🔄 Testing Cache Performance")
+        results = {}
         
         # Test multiple requests to same endpoint (should hit cache)
-        self.results["cache_hit_test"] = self.test_api_endpoint(
+        results["cache_hit_test"] = await self.test_get_throughput(
             "/api/cameras", concurrent_requests=50, total_requests=500
         )
         
         # Test active streams (lightweight cache)
-        self.results["active_streams_cache"] = self.test_api_endpoint(
+        results["active_streams_cache"] = await self.test_get_throughput(
             "/api/active-streams", concurrent_requests=30, total_requests=300
         )
+        
+        return results
     
-    def test_crud_operations(self):
+    async def test_crud_operations(self) -> Dict[str, Any]:
         """Test CRUD operations performance"""
         print("\n📝 Testing CRUD Operations")
-        
-        camera_data = {
-            "name": f"Test Camera {random.randint(1000, 9999)}",
-            "ip": f"192.168.1.{random.randint(100, 200)}",
-            "location": "Test Location"
-        }
+        results = {}
+        
+        # One payload per request, all sent in a single batched run.
+        # Host octets drawn in one RNG call, without replacement so IPs stay unique
+        n = 10
+        rng = np.random.default_rng()
+        ips = rng.choice(np.arange(100, 201), size=n, replace=False)
+        names = [f"Perf Test Camera {i}" for i in range(n)]
+        payloads = [
+            {"name": name, "ip": f"192.168.1.{ip}", "location": "Test Location"}
+            for name, ip in zip(names, ips.tolist())
+        ]
         
         # Test creating cameras
-        create_results = []
-        for i in range(10):
-            test_data = camera_data.copy()
-            test_data["ip"] = f"192.168.1.{150 + i}"
-            test_data["name"] = f"Perf Test Camera {i}"
-            
-            result = self.test_api_endpoint(
-                "/api/cameras", method="POST", data=test_data,
-                concurrent_requests=1, total_requests=1
-            )
-            create_results.append(result)
+        result = await self.test_api_endpoint_async(
+            "/api/cameras", method="POST", data=payloads,
+            concurrent_requests=5, total_requests=len(payloads)
+        )
         
-        avg_create_time = statistics.mean([r["avg_response_time"] for r in create_results if "avg_response_time" in r])
+        avg_create_time = result.get("avg_response_time", 0)
         print(f"   📝 Average camera creation time: {avg_create_time:.3f}s")
         
-        self.results["camera_creation"] = {
+        results["camera_creation"] = {
             "avg_response_time": avg_create_time,
-            "total_operations": len(create_results)
+            "total_operations": result.get("successful_requests", 0)
         }
+        
+        return results
     
-    def test_stream_operations(self):
+    async def test_stream_operations(self) -> Dict[str, Any]:
         """Test streaming operations"""
         print("\n📺 Testing Stream Operations")
+        results = {}
         
         # Start multiple streams
         stream_data = {"camera_id": "cam_1"}
-        self.results["start_streams"] = self.test_api_endpoint(
+        results["start_streams"] = await self.test_api_endpoint_async(
             "/api/start-stream", method="POST", data=stream_data,
             concurrent_requests=5, total_requests=20
         )
         
         # Stop streams
-        self.results["stop_streams"] = self.test_api_endpoint(
+        results["stop_streams"] = await self.test_api_endpoint_async(
             "/api/stop-stream", method="POST", data=stream_data,
             concurrent_requests=5, total_requests=20
         )
+        
+        return results
     
-    def test_rate_limiting(self):
-        """Test rate limiting"""
+    def test_rate_limiting(self, total_requests: int = 150, target_rps: float = 50.0):
+        """Test rate limiting with an open-loop generator
+        
+        Requests are sent on a fixed schedule (1/target_rps apart), independent of
+        response latency, so the send rate stays predictable if the server slows down.
+        """
         print("\n🚦 Testing Rate Limiting")
+        print(f"   Target send rate: {target_rps:.1f} req/s")
+        
+        url = f"{self.base_url}/api/cameras"
+        interval = 1.0 / target_rps
         
         # Send requests rapidly to trigger rate limiting
-        rapid_requests = []
-        start_time = time.time()
+        async def send_rapid_requests():
+            start_time = time.perf_counter()
+            
+            async def send(i):
+                scheduled = i * interval
+                delay = scheduled - (time.perf_counter() - start_time)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                sent = time.perf_counter() - start_time
+                try:
+                    response = await self.client.get(url)
+                    return {
+                        "status_code": response.status_code,
+                        "scheduled": scheduled,
+                        "sent": sent,
+                        "time": time.perf_counter() - start_time
+                    }
+                except Exception as e:
+                    return {
+                        "error": str(e),
+                        "scheduled": scheduled,
+                        "sent": sent,
+                        "time": time.perf_counter() - start_time
+                    }
+            
+            # Above default 100/hour limit
+            return await asyncio.gather(*(send(i) for i in range(total_requests)))
         
-        for i in range(150):  # Above default 100/hour limit
-            try:
-                response = self.session.get(f"{self.base_url}/api/cameras")
-                rapid_requests.append({
-                    "status_code": response.status_code,
-                    "time": time.time() - start_time
-                })
-            except Exception as e:
-                rapid_requests.append({
-                    "error": str(e),
-                    "time": time.time() - start_time
-                })
+        rapid_requests = self.run_async(send_rapid_requests())
         
-        rate_limited = len([r for r in rapid_requests if r.get("status_code") == 429])
-        successful = len([r for r in rapid_requests if r.get("status_code") == 200])
+        # Send rate actually achieved, to interpret the 429 count
+        send_window = max(r["sent"] for r in rapid_requests)
+        achieved_rps = (len(rapid_requests) - 1) / send_window if send_window > 0 else 0.0
+        
+        # Single pass over status codes (None = connection error)
+        codes = Counter(r.get("status_code") for r in rapid_requests)
+        rate_limited = codes[429]
+        successful = codes[200]
+        other = sum(count for code, count in codes.items() if code not in (200, 429))
         
         print(f"   ✅ Successful requests: {successful}")
         print(f"   🚫 Rate limited requests: {rate_limited}")
+        print(f"   ⚠️  Other responses/errors: {other}")
+        print(f"   📤 Achieved send rate: {achieved_rps:.1f} req/s")
         
         self.results["rate_limiting"] = {
             "total_requests": len(rapid_requests),
             "successful": successful,
-            "rate_limited": rate_limited
+            "rate_limited": rate_limited,
+            "other": other,
+            "status_codes": {str(code): count for code, count in codes.items()},
+            "target_rps": target_rps,
+            "achieved_rps": achieved_rps
         }
     
     def run_all_tests(self):
@@ -228,23 +490,34 @@ class PerformanceTest:
         
         try:
             # Check if server is running
-            response = self.session.get(f"{self.base_url}/api/cameras")
+            response = self.run_async(self.client.get(f"{self.base_url}/api/cameras"))
             response.raise_for_status()
             print("✅ Server is running and accessible")
         except Exception as e:
             print(f"❌ Cannot connect to server: {e}")
             return
         
-        start_time = time.time()
+        start_time = time.perf_counter()
+        
+        # Cache phase runs alone first: CRUD writes invalidate the camera-list cache and
+        # would contaminate the cache-hit vs no-cache comparison
+        self.results.update(self.run_async(self.test_cache_performance()))
         
-        # Run tests
-        self.test_database_performance()
-        self.test_cache_performance()
-        self.test_crud_operations()
-        self.test_stream_operations()
+        # Remaining independent phases run concurrently on the event loop
+        async def run_phases():
+            return await asyncio.gather(
+                self.test_database_performance(),
+                self.test_crud_operations(),
+                self.test_stream_operations()
+            )
+        
+        for phase_results in self.run_async(run_phases()):
+            self.results.update(phase_results)
+        
+        # Rate limiting runs last and alone: hitting the limit would skew the other phases
         self.test_rate_limiting()
         
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         
         # Generate report
         self.generate_report(total_time)
@@ -295,8 +568,9 @@ class PerformanceTest:
                 print("   ⚠️  Response times could be improved")
         
         # Save detailed results
-        with open("performance_test_results.json", "w") as f:
-            json.dump(self.results, f, indent=2)
+        Path("performance_test_results.json").write_bytes(
+            orjson.dumps(self.results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        )
         print(f"\n💾 Detailed results saved to: performance_test_results.json")
 
 if __name__ == "__main__":
@@ -305,8 +579,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Performance test for StreamCameraSecurity")
     parser.add_argument("--url", default="http://localhost:5000", 
                        help="Base URL of the application (default: http://localhost:5000)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Client processes for the Python load generator (default: 1)")
     
     args = parser.parse_args()
     
-    tester = PerformanceTest(args.url)
-    tester.run_all_tests() 
\ No newline at end of file
+    tester = PerformanceTest(args.url, worker_count=args.workers)
+    try:
+        tester.run_all_tests()
+    finally:
+        tester.close() 
\ No newline at end of file
@@ -1,13 +1,19 @@
 import asyncio
 import concurrent.futures
 import logging
+import multiprocessing
 import time
 from typing import List, Dict, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import uuid
 import cv2
 import numpy as np
 import os
+import queue
+import threading
+from sqlalchemy import select, func, insert, delete
+from sqlalchemy.exc import IntegrityError
 
 from models import db, Camera, Detection, StreamSession, DetectionSchedule
 from cache import CameraCache, StreamCache, DetectionCache, cache_manager
@@ -62,18 +68,32 @@ class CameraService:
             logger.error(f"Lỗi khi lấy camera {camera_id}: {e}")
             return None
     
+    @staticmethod
+    def get_cameras_by_ids(camera_ids: List[str], use_cache=True) -> Dict[str, Dict]:
+        """Lấy nhiều camera: một MGET cache + một query IN cho các camera chưa có trong cache"""
+        cameras = CameraCache.mget_camera_details(camera_ids) if use_cache else {}
+        
+        missing = [camera_id for camera_id in camera_ids if camera_id not in cameras]
+        if not missing:
+            return cameras
+        
+        try:
+            fetched = {camera.id: camera.to_dict()
+                       for camera in Camera.query.filter(Camera.id.in_(missing)).all()}
+            if use_cache and fetched:
+                CameraCache.set_camera_details(fetched)
+            cameras.update(fetched)
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy {len(missing)} cameras: {e}")
+        
+        return cameras
+    
     @staticmethod
     def create_camera(camera_data: Dict) -> Tuple[bool, str, Optional[Dict]]:
         """Tạo camera mới"""
         try:
-            # Check if IP already exists
-            existing_camera = Camera.query.filter_by(ip=camera_data['ip']).first()
-            if existing_camera:
-                return False, "IP camera đã tồn tại", None
-            
-            # Generate new ID
-            cameras_count = Camera.query.count()
-            camera_id = f"cam_{cameras_count + 1}"
+            # ID ngẫu nhiên: không cần COUNT(*) và không trùng khi tạo đồng thời
+            camera_id = f"cam_{uuid.uuid4().hex}"
             
             camera = Camera(
                 id=camera_id,
@@ -86,12 +106,17 @@ class CameraService:
             db.session.add(camera)
             db.session.commit()
             
-            # Invalidate cache
-            CameraCache.invalidate_all()
+            # Camera mới chưa có cache chi tiết, chỉ danh sách thay đổi
+            CameraCache.invalidate_camera_list()
             
             logger.info(f"Tạo camera mới: {camera_id}")
             return True, "Camera đã được tạo thành công", camera.to_dict()
         
+        except IntegrityError:
+            # Unique constraint trên cameras.ip thay cho query kiểm tra trước khi insert
+            db.session.rollback()
+            return False, "IP camera đã tồn tại", None
+        
         except Exception as e:
             db.session.rollback()
             logger.error(f"Lỗi khi tạo camera: {e}")
@@ -107,8 +132,9 @@ class CameraService:
             
             # Check IP conflict if IP is being updated
             if 'ip' in update_data and update_data['ip'] != camera.ip:
-                existing_camera = Camera.query.filter_by(ip=update_data['ip']).first()
-                if existing_camera:
+                # EXISTS thay vì load cả dòng camera
+                ip_exists = db.session.query(Camera.query.filter_by(ip=update_data['ip']).exists()).scalar()
+                if ip_exists:
                     return False, "IP camera đã tồn tại", None
             
             # Update fields
@@ -121,10 +147,16 @@ class CameraService:
             
             # Invalidate cache
             CameraCache.invalidate_camera(camera_id)
+            invalidate_frame_template(camera_id)
             
             logger.info(f"Cập nhật camera: {camera_id}")
             return True, "Camera đã được cập nhật", camera.to_dict()
         
+        except IntegrityError:
+            # Camera khác lấy IP này giữa lúc kiểm tra và commit
+            db.session.rollback()
+            return False, "IP camera đã tồn tại", None
+        
         except Exception as e:
             db.session.rollback()
             logger.error(f"Lỗi khi cập nhật camera {camera_id}: {e}")
@@ -134,20 +166,22 @@ class CameraService:
     def delete_camera(camera_id: str) -> Tuple[bool, str]:
         """Xóa camera"""
         try:
-            camera = Camera.query.get(camera_id)
-            if not camera:
+            # Xóa bảng con bằng DELETE set-based trước camera: DB cũ tạo bằng create_all (chưa chạy
+            # migration 005) không có ON DELETE CASCADE, mà SQLite đã bật foreign_keys
+            db.session.execute(delete(Detection).where(Detection.camera_id == camera_id))
+            db.session.execute(delete(StreamSession).where(StreamSession.camera_id == camera_id))
+            deleted = db.session.execute(delete(Camera).where(Camera.id == camera_id)).rowcount
+            if not deleted:
+                db.session.rollback()
                 return False, "Camera không tồn tại"
-            
-            # Stop any active streams
-            StreamService.stop_camera_stream(camera_id)
-            
-            # Delete camera (cascade will delete related records)
-            db.session.delete(camera)
             db.session.commit()
             
+            # Stream sessions đã bị xóa, chỉ cần bỏ khỏi active streams
+            StreamService._remove_active_streams(camera_id)
+            
             # Invalidate cache
             CameraCache.invalidate_camera(camera_id)
-            StreamCache.invalidate_streams()
+            invalidate_frame_template(camera_id)
             
             logger.info(f"Xóa camera: {camera_id}")
             return True, "Camera đã được xóa"
@@ -160,39 +194,73 @@ class CameraService:
 class StreamService:
     """Service layer cho Stream operations"""
     
-    active_streams = set()  # In-memory active streams tracking
+    # Nguồn chính là Redis SET (StreamCache); set này chỉ dùng khi không có Redis
+    active_streams = set()
+    _streams_lock = threading.Lock()
     
     @staticmethod
-    def get_active_streams(use_cache=True) -> List[str]:
+    def get_active_streams() -> List[str]:
         """Lấy danh sách stream đang hoạt động"""
-        if use_cache:
-            cached_streams = StreamCache.get_active_streams()
-            if cached_streams is not None:
-                return cached_streams
+        streams = StreamCache.get_active_streams()
+        if streams is not None:
+            return streams
         
-        # Return from in-memory tracking
-        streams_list = list(StreamService.active_streams)
+        with StreamService._streams_lock:
+            return list(StreamService.active_streams)
+    
+    @staticmethod
+    def _add_active_stream(camera_id: str) -> bool:
+        """Thêm camera vào active streams; False nếu đã đủ MAX_CAMERAS_STREAM"""
+        added = StreamCache.add_stream(camera_id, Config.MAX_CAMERAS_STREAM)
+        if added is not None:
+            return added
         
-        if use_cache:
-            StreamCache.set_active_streams(streams_list)
+        with StreamService._streams_lock:
+            streams = StreamService.active_streams
+            if len(streams) >= Config.MAX_CAMERAS_STREAM and camera_id not in streams:
+                return False
+            streams.add(camera_id)
+            return True
+    
+    @staticmethod
+    def _remove_active_streams(*camera_ids: str):
+        """Bỏ camera khỏi active streams"""
+        if StreamCache.remove_streams(*camera_ids) is not None:
+            return
         
-        return streams_list
+        with StreamService._streams_lock:
+            StreamService.active_streams.difference_update(camera_ids)
+    
+    @staticmethod
+    def sync_active_streams() -> List[str]:
+        """Dựng lại active streams từ các StreamSession 'active' trong DB
+        
+        Redis SET sống qua restart server: gọi lúc khởi động để slot của stream không còn
+        session (commit lỗi, process chết giữa chừng) không chiếm MAX_CAMERAS_STREAM mãi.
+        """
+        camera_ids = list(db.session.execute(
+            select(StreamSession.camera_id).where(StreamSession.status == 'active').distinct()
+        ).scalars())
+        
+        if StreamCache.replace_streams(camera_ids) is None:
+            with StreamService._streams_lock:
+                StreamService.active_streams = set(camera_ids)
+        return camera_ids
     
     @staticmethod
     def start_camera_stream(camera_id: str) -> Tuple[bool, str]:
         """Bắt đầu stream camera"""
+        added = False
         try:
             # Check camera exists
             camera = Camera.query.get(camera_id)
             if not camera:
                 return False, "Camera không tồn tại"
             
-            # Check stream limit
-            if len(StreamService.active_streams) >= Config.MAX_CAMERAS_STREAM and camera_id not in StreamService.active_streams:
+            # Check stream limit + add to active streams (atomic)
+            if not StreamService._add_active_stream(camera_id):
                 return False, f"Không thể stream quá {Config.MAX_CAMERAS_STREAM} camera cùng lúc"
-            
-            # Add to active streams
-            StreamService.active_streams.add(camera_id)
+            added = True
             
             # Create stream session record
             session = StreamSession(
@@ -203,14 +271,14 @@ class StreamService:
             db.session.add(session)
             db.session.commit()
             
-            # Invalidate cache
-            StreamCache.invalidate_streams()
-            
             logger.info(f"Bắt đầu stream camera {camera_id}")
             return True, "Stream đã được bắt đầu"
         
         except Exception as e:
             db.session.rollback()
+            # Session không được ghi -> trả lại slot đã chiếm
+            if added:
+                StreamService._remove_active_streams(camera_id)
             logger.error(f"Lỗi khi bắt đầu stream {camera_id}: {e}")
             return False, f"Lỗi hệ thống: {str(e)}"
     
@@ -219,24 +287,20 @@ class StreamService:
         """Dừng stream camera"""
         try:
             # Remove from active streams
-            StreamService.active_streams.discard(camera_id)
+            StreamService._remove_active_streams(camera_id)
             
-            # Update stream session records
-            active_sessions = StreamSession.query.filter_by(
+            # Update stream session records: một UPDATE cho mọi session active của camera
+            updated = StreamSession.query.filter_by(
                 camera_id=camera_id,
                 status='active'
-            ).all()
-            
-            for session in active_sessions:
-                session.ended_at = datetime.utcnow()
-                session.status = 'stopped'
+            ).update(
+                {'ended_at': datetime.utcnow(), 'status': 'stopped'},
+                synchronize_session=False
+            )
             
-            if active_sessions:
+            if updated:
                 db.session.commit()
             
-            # Invalidate cache
-            StreamCache.invalidate_streams()
-            
             logger.info(f"Dừng stream camera {camera_id}")
             return True, "Stream đã được dừng"
         
@@ -249,14 +313,28 @@ class StreamService:
     def stop_all_streams() -> Tuple[bool, str]:
         """Dừng tất cả streams"""
         try:
-            camera_ids = list(StreamService.active_streams)
-            for camera_id in camera_ids:
-                StreamService.stop_camera_stream(camera_id)
+            camera_ids = StreamService.get_active_streams()
+            if camera_ids:
+                # SREM đúng các id đã đọc, không xóa stream được thêm đồng thời
+                StreamService._remove_active_streams(*camera_ids)
+            
+            # Một UPDATE + một commit + một lần invalidate cho tất cả camera
+            stopped_sessions = 0
+            if camera_ids:
+                stopped_sessions = StreamSession.query.filter(
+                    StreamSession.camera_id.in_(camera_ids),
+                    StreamSession.status == 'active'
+                ).update(
+                    {'ended_at': datetime.utcnow(), 'status': 'stopped'},
+                    synchronize_session=False
+                )
+                db.session.commit()
             
-            logger.info(f"Dừng tất cả {len(camera_ids)} streams")
+            logger.info(f"Dừng tất cả {len(camera_ids)} streams ({stopped_sessions} sessions)")
             return True, f"Đã dừng {len(camera_ids)} streams"
         
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Lỗi khi dừng tất cả streams: {e}")
             return False, f"Lỗi hệ thống: {str(e)}"
 
@@ -277,16 +355,31 @@ class DetectionService:
                 return cached_results, cached_count
         
         try:
-            # Get paginated results
-            query = Detection.query.order_by(Detection.timestamp.desc())
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
+            # Get paginated results: tổng số dòng lấy bằng COUNT(*) OVER () trong cùng query,
+            # không cần query COUNT riêng như paginate()
+            stmt = (
+                select(Detection, func.count().over().label('total'))
+                .order_by(Detection.timestamp.desc())
+                .limit(per_page)
+                .offset((page - 1) * per_page)
             )
+            rows = db.session.execute(stmt).all()
+            detections = [row[0] for row in rows]
             
-            results = [detection.to_dict() for detection in pagination.items]
-            total_count = pagination.total
+            if rows:
+                total_count = rows[0].total
+            elif page > 1:
+                # Trang vượt quá số dòng: không có row để đọc window count
+                total_count = db.session.query(func.count(Detection.id)).scalar()
+            else:
+                total_count = 0
+            
+            # Lấy camera của cả trang trong một query thay vì lazy load từng detection
+            camera_ids = {detection.camera_id for detection in detections}
+            cameras = Camera.query.filter(Camera.id.in_(camera_ids)).all() if camera_ids else []
+            camera_info_by_id = {camera.id: camera.to_dict() for camera in cameras}
+            
+            results = [detection.to_dict(camera_info_by_id) for detection in detections]
             
             # Cache results
             if use_cache:
@@ -319,8 +412,8 @@ class DetectionService:
             db.session.add(detection)
             db.session.commit()
             
-            # Invalidate cache
-            DetectionCache.invalidate_detection_results()
+            # Invalidate cache (tổng số được cộng thêm, không xóa)
+            DetectionCache.invalidate_for_insert()
             
             logger.info(f"Lưu detection result cho camera {camera_id}")
             return True
@@ -330,127 +423,351 @@ class DetectionService:
             logger.error(f"Lỗi khi lưu detection result: {e}")
             return False
 
+    @staticmethod
+    def save_detection_results_bulk(results: List[Dict], test_mode: bool = False,
+                                    real_camera: bool = False) -> int:
+        """Lưu nhiều kết quả phát hiện trong một INSERT và một commit"""
+        try:
+            rows = [
+                {
+                    'camera_id': result['camera_id'],
+                    'timestamp': result['timestamp'],
+                    'image_path': result['image_path'],
+                    'faces_count': result['faces_count'],
+                    'test_mode': test_mode,
+                    'real_camera': real_camera,
+                    'schedule_id': result.get('schedule_id')
+                }
+                for result in results
+            ]
+            
+            db.session.execute(insert(Detection), rows)
+            db.session.commit()
+            
+            # Invalidate cache một lần cho cả batch
+            DetectionCache.invalidate_for_insert(len(rows))
+            
+            logger.info(f"Lưu {len(rows)} detection results")
+            return len(rows)
+        
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Lỗi khi lưu detection results: {e}")
+            return 0
+
+# Face detection chạy trong process pool dùng chung: mỗi worker process có detector riêng,
+# không tranh GIL với request threads
+FRAME_SHAPE = (480, 640)
+# YuNet (DNN, int8) khi có model file, nhận frame BGR; ngược lại Haar cascade trên grayscale
+USE_YUNET = hasattr(cv2, 'FaceDetectorYN') and os.path.isfile(Config.YUNET_MODEL_PATH)
+_detection_pool = None
+_worker_detector = None
+
+def _ellipse_mask(cx: int, cy: int, rx: int, ry: int, lower_half: bool = False) -> np.ndarray:
+    """Mask bool (H, W) của hình ellipse đặc (lower_half: chỉ nửa dưới, y >= cy)"""
+    yy, xx = np.ogrid[:FRAME_SHAPE[0], :FRAME_SHAPE[1]]
+    mask = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1
+    if lower_half:
+        mask &= yy >= cy
+    return mask
+
+# Khuôn mặt giả cho frame mô phỏng: tính mask một lần, mỗi frame chỉ là gán theo mask
+_SIM_FACE_MASK = _ellipse_mask(320, 240, 100, 100)
+_SIM_FEATURES_MASK = (
+    _ellipse_mask(280, 200, 20, 20)                       # Left eye
+    | _ellipse_mask(360, 200, 20, 20)                     # Right eye
+    | _ellipse_mask(320, 280, 60, 30, lower_half=True)    # Mouth
+)
+
+# Ảnh detection: quality 80 + optimized Huffman, nhỏ hơn nhiều so với mặc định 95
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+
+# Haar: giới hạn kích thước mặt để bớt các tầng image pyramid không cần thiết
+HAAR_DETECT_KWARGS = {
+    'scaleFactor': 1.3,
+    'minNeighbors': 5,
+    'minSize': (30, 30),
+    'maxSize': (300, 300),
+    'flags': cv2.CASCADE_SCALE_IMAGE
+}
+_cascade_local = threading.local()
+
+def get_thread_face_cascade() -> cv2.CascadeClassifier:
+    """Haar CascadeClassifier riêng cho thread hiện tại (không dùng chung giữa request threads)"""
+    cascade = getattr(_cascade_local, 'cascade', None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _cascade_local.cascade = cascade
+    return cascade
+
+# Encode + ghi ảnh trong một writer thread riêng, hàng đợi bounded để giới hạn bộ nhớ.
+# Mỗi ảnh kèm một Future riêng: caller chỉ đợi ảnh của mình, không join cả hàng đợi dùng chung
+_image_write_queue = queue.Queue(maxsize=64)
+_image_writer = None
+_image_writer_lock = threading.Lock()
+
+def _init_detection_worker():
+    """Khởi tạo worker process: một detector, OpenCV không tự spawn thêm threads"""
+    global _worker_detector
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(1)
+    if USE_YUNET:
+        _worker_detector = cv2.FaceDetectorYN.create(
+            Config.YUNET_MODEL_PATH, '', (FRAME_SHAPE[1], FRAME_SHAPE[0]),
+            backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+            target_id=cv2.dnn.DNN_TARGET_CPU
+        )
+    else:
+        _worker_detector = get_thread_face_cascade()
+
+def _detect_faces_batch(batch: np.ndarray) -> List[np.ndarray]:
+    """Detect faces cho từng frame trong batch, trả về (x, y, w, h) (chạy trong worker process)"""
+    if not USE_YUNET:
+        return [_worker_detector.detectMultiScale(gray, **HAAR_DETECT_KWARGS) for gray in batch]
+    
+    results = []
+    for frame in batch:
+        _, faces = _worker_detector.detect(frame)
+        results.append(faces[:, :4].astype(np.int32) if faces is not None else np.empty((0, 4), np.int32))
+    return results
+
+def _image_writer_loop():
+    """Writer thread: encode JPEG + ghi file cho các frame trong hàng đợi"""
+    while True:
+        frame, filepath, done = _image_write_queue.get()
+        ok = False
+        try:
+            ok, encoded = cv2.imencode('.jpg', frame, JPEG_PARAMS)
+            if ok:
+                encoded.tofile(filepath)
+            else:
+                logger.error(f"Không encode được ảnh {filepath}")
+        except Exception as e:
+            ok = False
+            logger.error(f"Lỗi khi ghi ảnh {filepath}: {e}")
+        finally:
+            done.set_result(bool(ok))
+
+def _enqueue_image_write(frame: np.ndarray, filepath: str) -> concurrent.futures.Future:
+    """Đưa frame vào hàng đợi ghi ảnh (block khi hàng đợi đầy), start writer thread lần đầu
+    
+    Trả về Future hoàn thành (True nếu ghi được) khi ảnh này đã ghi xong.
+    """
+    global _image_writer
+    with _image_writer_lock:
+        if _image_writer is None:
+            _image_writer = threading.Thread(target=_image_writer_loop, name='detection-image-writer', daemon=True)
+            _image_writer.start()
+    done = concurrent.futures.Future()
+    _image_write_queue.put((frame, filepath, done))
+    return done
+
+# camera_id -> frame nền đã vẽ thông tin camera (LRU, dùng chung mọi schedule thread).
+# CameraService bỏ entry khi camera được sửa/xóa để label không bị cũ
+FRAME_TEMPLATE_CACHE_SIZE = Config.MAX_CAMERAS_DETECTION * 2
+_frame_templates: OrderedDict = OrderedDict()
+_frame_templates_lock = threading.Lock()
+
+def invalidate_frame_template(camera_id: str):
+    """Bỏ frame nền đã cache của camera"""
+    with _frame_templates_lock:
+        _frame_templates.pop(camera_id, None)
+
+def _detection_mp_context():
+    """forkserver nếu platform hỗ trợ, ngược lại spawn (không bao giờ fork một process đa luồng)"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def _get_detection_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Process pool tạo lazily; mỗi batch chạy trọn trong một worker"""
+    global _detection_pool
+    if _detection_pool is None:
+        # forkserver: process này đã có thread (log listener, image writer) -> fork trực tiếp dễ deadlock
+        _detection_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=Config.MAX_WORKERS, initializer=_init_detection_worker,
+            mp_context=_detection_mp_context()
+        )
+    return _detection_pool
+
 class AsyncFaceDetectionService:
     """Service cho async face detection processing"""
     
     def __init__(self, max_workers=None):
         if max_workers is None:
             max_workers = Config.MAX_WORKERS
+        # Thread pool cho phần I/O (vẽ + ghi ảnh), detection chạy trong process pool
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Shape frame trong batch detection: grayscale (H, W) cho Haar, BGR (H, W, 3) cho YuNet
+        self._frame_shape = (*FRAME_SHAPE, 3) if USE_YUNET else FRAME_SHAPE
+        # Generator (PCG64) riêng mỗi thread, không dùng global RandomState có lock
+        self._rng = threading.local()
+        # Prefix đường dẫn tính một lần (thư mục đã được tạo lúc app khởi động)
+        self._det_prefix = Config.DETECTION_FOLDER.rstrip('/') + '/'
+        self._url_prefix = '/static/detections/'
+        # Scratch frame BGR cấp phát một lần cho mỗi thread (frame mô phỏng trước khi vào batch)
+        self._frame_buf = threading.local()
+    
+    def _scratch_frame(self) -> np.ndarray:
+        frame = getattr(self._frame_buf, 'frame', None)
+        if frame is None:
+            frame = self._frame_buf.frame = np.empty((*FRAME_SHAPE, 3), dtype=np.uint8)
+        return frame
+    
+    def _new_batch(self, size: int) -> np.ndarray:
+        """Batch riêng cho mỗi lần gọi: service dùng chung giữa các schedule thread, và process pool
+        pickle batch sau (feeder thread) nên buffer dùng chung có thể bị ghi đè trước khi gửi đi"""
+        return np.empty((size, *self._frame_shape), dtype=np.uint8)
     
     async def process_camera_frame_async(self, camera_id: str, schedule_id: str = None) -> Optional[Dict]:
         """Xử lý frame camera async"""
-        loop = asyncio.get_event_loop()
+        results = await self.process_multiple_cameras_async([camera_id], schedule_id)
+        return results[0] if results else None
+    
+    def _save_detection_frame(self, camera_id: str, frame: np.ndarray, faces: np.ndarray,
+                              schedule_id: str = None,
+                              pending_writes: Optional[List[concurrent.futures.Future]] = None) -> Optional[Dict]:
+        """Vẽ khung mặt, đưa ảnh vào hàng đợi ghi và trả về kết quả (chạy trong thread pool)
         
+        pending_writes: list của batch gọi, nhận Future ghi ảnh để batch chỉ đợi ảnh của chính nó.
+        """
         try:
-            # Run face detection in thread pool
-            result = await loop.run_in_executor(
-                self.executor,
-                self._process_single_camera,
-                camera_id,
-                schedule_id
-            )
-            return result
+            # Draw rectangles around faces
+            for (x, y, w, h) in faces:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+            
+            # Save image
+            timestamp = int(time.time())
+            filename = f"{camera_id}_{timestamp}.jpg"
+            if schedule_id:
+                filename = f"{camera_id}_{timestamp}_{schedule_id}.jpg"
+            
+            filepath = self._det_prefix + filename
+            write_done = _enqueue_image_write(frame, filepath)
+            if pending_writes is not None:
+                pending_writes.append(write_done)
+            
+            # DB insert được gom lại trong process_multiple_cameras_async
+            image_path = self._url_prefix + filename
+            
+            return {
+                "camera_id": camera_id,
+                "timestamp": timestamp,
+                "image_path": image_path,
+                "faces_count": len(faces),
+                "schedule_id": schedule_id
+            }
         
         except Exception as e:
-            logger.error(f"Lỗi async face detection cho camera {camera_id}: {e}")
+            logger.error(f"Lỗi khi xử lý camera {camera_id}: {e}")
             return None
     
-    def _process_single_camera(self, camera_id: str, schedule_id: str = None) -> Optional[Dict]:
-        """Xử lý một camera (chạy trong thread pool)"""
-        try:
-            # Simulate camera frame (replace with real camera connection)
-            frame = self._simulate_camera_frame(camera_id)
-            if frame is None:
-                return None
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+    def _get_frame_template(self, camera_id: str, camera: Optional[Dict] = None) -> np.ndarray:
+        """Frame nền của camera (text thông tin camera vẽ sẵn), tạo một lần cho mỗi camera
+        
+        camera: dict camera đã prefetch (process_multiple_cameras_async lấy cả batch một lần)
+        """
+        with _frame_templates_lock:
+            template = _frame_templates.get(camera_id)
+            if template is not None:
+                _frame_templates.move_to_end(camera_id)
+        if template is None:
+            template = np.zeros((480, 640, 3), dtype=np.uint8)
             
-            if len(faces) > 0:
-                # Draw rectangles around faces
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                
-                # Save image
-                timestamp = int(time.time())
-                filename = f"{camera_id}_{timestamp}.jpg"
-                if schedule_id:
-                    filename = f"{camera_id}_{timestamp}_{schedule_id}.jpg"
-                
-                filepath = os.path.join(Config.DETECTION_FOLDER, filename)
-                cv2.imwrite(filepath, frame)
-                
-                # Save to database
-                image_path = f"/static/detections/{filename}"
-                DetectionService.save_detection_result(
-                    camera_id=camera_id,
-                    timestamp=timestamp,
-                    image_path=image_path,
-                    faces_count=len(faces),
-                    test_mode=False,
-                    real_camera=False,
-                    schedule_id=schedule_id
-                )
+            # Add camera info
+            if camera:
+                cv2.putText(template, camera["name"], (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                cv2.putText(template, f"IP: {camera['ip']}", (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                cv2.putText(template, f"Location: {camera['location']}", (20, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
                 
-                return {
-                    "camera_id": camera_id,
-                    "timestamp": timestamp,
-                    "image_path": image_path,
-                    "faces_count": len(faces),
-                    "schedule_id": schedule_id
-                }
-            
-            return None
-        
-        except Exception as e:
-            logger.error(f"Lỗi khi xử lý camera {camera_id}: {e}")
-            return None
+                # Chỉ cache template có thông tin camera (camera không tồn tại -> frame trống, không giữ)
+                with _frame_templates_lock:
+                    _frame_templates[camera_id] = template
+                    if len(_frame_templates) > FRAME_TEMPLATE_CACHE_SIZE:
+                        _frame_templates.popitem(last=False)
+        return template
     
-    def _simulate_camera_frame(self, camera_id: str):
-        """Simulate camera frame (replace with real camera connection)"""
+    def _simulate_camera_frame(self, camera_id: str, out: np.ndarray, camera: Optional[Dict] = None,
+                               has_face: Optional[bool] = None) -> Optional[bool]:
+        """Simulate camera frame vào buffer out (replace with real camera connection)
+        
+        has_face: None -> ngẫu nhiên; trả về frame có mặt hay không (None nếu lỗi).
+        """
         try:
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
+            np.copyto(out, self._get_frame_template(camera_id, camera))
             
-            # 30% chance of having a face for demo
-            if np.random.random() < 0.3:
-                # Draw a circle representing a face
-                cv2.circle(frame, (320, 240), 100, (0, 0, 255), -1)
-                cv2.circle(frame, (280, 200), 20, (255, 255, 255), -1)  # Left eye
-                cv2.circle(frame, (360, 200), 20, (255, 255, 255), -1)  # Right eye
-                cv2.ellipse(frame, (320, 280), (60, 30), 0, 0, 180, (255, 255, 255), -1)  # Mouth
+            if has_face is None:
+                rng = getattr(self._rng, 'generator', None)
+                if rng is None:
+                    rng = self._rng.generator = np.random.default_rng()
+                # 30% chance of having a face for demo
+                has_face = rng.random() < 0.3
             
-            # Add camera info
-            camera = CameraService.get_camera_by_id(camera_id)
-            if camera:
-                cv2.putText(frame, camera["name"], (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                cv2.putText(frame, f"IP: {camera['ip']}", (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(frame, f"Location: {camera['location']}", (20, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            if has_face:
+                # Draw a circle representing a face
+                out[_SIM_FACE_MASK] = (0, 0, 255)
+                out[_SIM_FEATURES_MASK] = (255, 255, 255)
             
-            return frame
+            return has_face
         
         except Exception as e:
             logger.error(f"Lỗi khi simulate camera frame {camera_id}: {e}")
             return None
     
+    def _render_detection_frame(self, camera_id: str, has_face: bool) -> np.ndarray:
+        """Frame BGR riêng cho ảnh lưu lại (chỉ các frame có detection, đi vào hàng đợi ghi)"""
+        frame = np.empty((*FRAME_SHAPE, 3), dtype=np.uint8)
+        self._simulate_camera_frame(camera_id, frame, has_face=has_face)
+        return frame
+    
     async def process_multiple_cameras_async(self, camera_ids: List[str], schedule_id: str = None) -> List[Dict]:
-        """Xử lý nhiều camera async"""
-        tasks = []
-        for camera_id in camera_ids:
-            task = self.process_camera_frame_async(camera_id, schedule_id)
-            tasks.append(task)
+        """Xử lý nhiều camera async: detect cả batch trong một lần gọi sang process pool"""
+        loop = asyncio.get_running_loop()
         
         try:
-            # Wait for all tasks with timeout
-            results = await asyncio.wait_for(
-                asyncio.gather(*tasks, return_exceptions=True),
+            # Thông tin camera cho các template chưa tạo: một lần cho cả batch
+            with _frame_templates_lock:
+                missing = [camera_id for camera_id in camera_ids if camera_id not in _frame_templates]
+            cameras = await asyncio.to_thread(CameraService.get_cameras_by_ids, missing) if missing else {}
+            
+            # Simulate frames thẳng vào batch (YuNet) hoặc qua scratch frame rồi cvtColor (Haar):
+            # không cấp phát frame mới cho mỗi camera
+            batch = self._new_batch(len(camera_ids))
+            scratch = None if USE_YUNET else self._scratch_frame()
+            frames = []
+            for camera_id in camera_ids:
+                slot = batch[len(frames)]
+                has_face = self._simulate_camera_frame(
+                    camera_id, slot if USE_YUNET else scratch, cameras.get(camera_id)
+                )
+                if has_face is None:
+                    continue
+                if not USE_YUNET:
+                    cv2.cvtColor(scratch, cv2.COLOR_BGR2GRAY, dst=slot)
+                frames.append((camera_id, has_face))
+            
+            if not frames:
+                return []
+            
+            # Detect faces cho cả batch với timeout
+            faces_per_frame = await asyncio.wait_for(
+                loop.run_in_executor(_get_detection_pool(), _detect_faces_batch, batch[:len(frames)]),
                 timeout=Config.FACE_DETECTION_TIMEOUT
             )
             
+            # Vẽ + ghi ảnh cho các frame có mặt người (chỉ các frame này cần buffer riêng)
+            pending_writes = []
+            tasks = [
+                loop.run_in_executor(
+                    self.executor, self._save_detection_frame,
+                    camera_id, self._render_detection_frame(camera_id, has_face), faces, schedule_id,
+                    pending_writes
+                )
+                for (camera_id, has_face), faces in zip(frames, faces_per_frame)
+                if len(faces) > 0
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            
             # Filter successful results
             successful_results = []
             for result in results:
@@ -459,6 +776,15 @@ class AsyncFaceDetectionService:
                 elif isinstance(result, Exception):
                     logger.error(f"Task failed: {result}")
             
+            # Một INSERT nhiều dòng + một commit cho cả batch camera, chạy ngoài event loop
+            # (to_thread copy contextvars nên app context / session đi theo)
+            if successful_results:
+                await asyncio.to_thread(DetectionService.save_detection_results_bulk, successful_results)
+                # DB insert chạy song song với writer thread; đợi ảnh của batch này ghi xong trước khi
+                # trả kết quả (kết quả được gửi qua WebSocket kèm image_path). Không join cả hàng đợi:
+                # ảnh của các schedule khác đang chạy không làm chậm batch này
+                await asyncio.gather(*(asyncio.wrap_future(done) for done in pending_writes))
+            
             return successful_results
         
         except asyncio.TimeoutError:
@@ -4,73 +4,271 @@ Simple Performance Test cho Face Detection nhiều camera
 Không cần psutil, chỉ test cơ bản
 """
 
+import os
+import sys
 import time
+import heapq
+import zlib
 import cv2
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-from typing import List, Dict
+import multiprocessing as mp
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Tuple, Optional
+
+FRAME_SIZE = (640, 480)  # (width, height)
+# Detect ở độ phân giải thấp hơn (pyramid shortcut): fake face bán kính 80px vẫn đủ lớn ở 0.5x
+# mà chỉ còn 1/4 số pixel. Frame được sinh thẳng ở DETECT_SIZE (như substream của camera), không resize.
+DETECTION_SCALE = float(os.environ.get('DETECTION_SCALE', 0.5))
+DETECT_SIZE = (round(FRAME_SIZE[0] * DETECTION_SCALE), round(FRAME_SIZE[1] * DETECTION_SCALE))
+HAAR_MIN_FACE_SIZE = (20, 20)
+# YuNet ONNX model (DNN, nhận frame BGR trực tiếp); không có file thì dùng Haar cascade
+YUNET_MODEL_PATH = os.environ.get('YUNET_MODEL_PATH', 'models/face_detection_yunet_2023mar_int8.onnx')
+
+# Số worker process cho parallel test: mỗi process có GIL + detector riêng.
+# Mỗi worker chạy OpenCV với CV_THREADS_PER_WORKER threads -> giữ
+# MAX_WORKERS × CV_THREADS_PER_WORKER ≈ số core để không oversubscribe.
+# Sequential test giữ mặc định của OpenCV (một camera dùng mọi core).
+MAX_WORKERS = os.cpu_count() or 4
+CV_THREADS_PER_WORKER = 1
+# Parallel test gom các camera tới hạn trong BATCH_WINDOW_NS thành batch tối đa DETECTION_BATCH camera / task
+DETECTION_BATCH = 8
+BATCH_WINDOW_NS = 5_000_000  # 5 ms
+# 'cpu' (baseline) hoặc 'ocl': OpenCV T-API, frame bọc cv2.UMat -> cvtColor/detect chạy OpenCL nếu có thiết bị
+DETECTION_BACKEND = os.environ.get('DETECTION_BACKEND', 'cpu')
+
+def create_face_detector():
+    """YuNet nếu có model (và OpenCV hỗ trợ), ngược lại Haar CascadeClassifier"""
+    if hasattr(cv2, 'FaceDetectorYN') and os.path.isfile(YUNET_MODEL_PATH):
+        return cv2.FaceDetectorYN.create(
+            YUNET_MODEL_PATH, "", DETECT_SIZE,
+            backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+            target_id=cv2.dnn.DNN_TARGET_CPU
+        )
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+def configure_backend(backend: str) -> str:
+    """Bật/tắt OpenCL cho process hiện tại; trả về backend thực tế ('ocl' chỉ khi có OpenCL)"""
+    use_ocl = backend == 'ocl' and cv2.ocl.haveOpenCL()
+    cv2.ocl.setUseOpenCL(use_ocl)
+    return 'ocl' if use_ocl else 'cpu'
+
+def detect_faces(detector, frame: np.ndarray, use_ocl: bool = False) -> int:
+    """Số khuôn mặt trong frame (grayscale hoặc BGR cho Haar, BGR cho YuNet)
+    
+    use_ocl: bọc frame thành cv2.UMat để cvtColor + detection dùng kernel OpenCL (T-API).
+    """
+    is_gray = frame.ndim == 2
+    if use_ocl:
+        frame = cv2.UMat(frame)
+    
+    if isinstance(detector, cv2.CascadeClassifier):
+        gray = frame if is_gray else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return len(detector.detectMultiScale(gray, 1.1, 4, minSize=HAAR_MIN_FACE_SIZE))
+    
+    _, faces = detector.detect(frame)
+    return 0 if faces is None else len(faces)
+
+# Detector + frame buffer của worker process (tạo một lần trong initializer)
+_worker_detector = None
+_worker_frame = None
+_worker_use_ocl = False
+
+def _init_detection_worker(backend: str = 'cpu'):
+    global _worker_detector, _worker_frame, _worker_use_ocl
+    cv2.setNumThreads(CV_THREADS_PER_WORKER)
+    _worker_use_ocl = configure_backend(backend) == 'ocl'
+    _worker_detector = create_face_detector()
+    _worker_frame = new_frame_buffer(_worker_detector)
+
+def _timed_detect_faces(camera_id: str, has_face: bool) -> Tuple[int, int]:
+    """(số khuôn mặt, thời gian detect tính bằng ns) - chạy trong worker process
+    
+    Frame vẽ vào buffer của worker: không cấp phát mới, không pickle frame qua process.
+    """
+    frame = draw_test_frame(_worker_frame, camera_id, has_face)
+    detection_start = time.perf_counter_ns()
+    face_count = detect_faces(_worker_detector, frame, _worker_use_ocl)
+    return face_count, time.perf_counter_ns() - detection_start
+
+def _timed_detect_batch(items: List[Tuple[str, bool]]) -> List[Tuple[int, int]]:
+    """_timed_detect_faces cho một batch (camera_id, has_face): một task/IPC round-trip cho nhiều camera"""
+    return [_timed_detect_faces(camera_id, has_face) for camera_id, has_face in items]
+
+def _pool_context():
+    """forkserver trên Linux: worker fork từ server process sạch, không import lại OpenCV mỗi lần spawn"""
+    if sys.platform.startswith('linux'):
+        return mp.get_context('forkserver')
+    return mp.get_context()
+
+def create_detection_pool(max_workers: int = MAX_WORKERS, backend: str = 'cpu') -> ProcessPoolExecutor:
+    """Process pool detection; worker khởi tạo detector + buffer + backend một lần trong initializer"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context(),
+                               initializer=_init_detection_worker, initargs=(backend,))
+
+def _worker_ready() -> bool:
+    return _worker_detector is not None
+
+def warm_up_pool(pool: ProcessPoolExecutor, max_workers: int = MAX_WORKERS):
+    """Spawn + chạy initializer cho các worker trước khi đo (không tính vào frame đầu tiên)"""
+    for future in [pool.submit(_worker_ready) for _ in range(max_workers)]:
+        future.result()
+
+def _ellipse_masks(cx: int, cy: int, rx: int, ry: int, thickness: int = -1, lower_half: bool = False) -> np.ndarray:
+    """Mask bool (H, W) ở DETECT_SIZE của ellipse: đặc (thickness=-1) hoặc viền dày thickness px
+    
+    Tọa độ/bán kính tính theo FRAME_SIZE, được scale theo DETECTION_SCALE.
+    """
+    cx, cy, rx, ry = (v * DETECTION_SCALE for v in (cx, cy, rx, ry))
+    yy, xx = np.ogrid[:DETECT_SIZE[1], :DETECT_SIZE[0]]
+    if thickness < 0:
+        mask = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1
+    else:
+        half = thickness / 2
+        outer = ((xx - cx) / (rx + half)) ** 2 + ((yy - cy) / (ry + half)) ** 2 <= 1
+        inner = ((xx - cx) / (rx - half)) ** 2 + ((yy - cy) / (ry - half)) ** 2 < 1
+        mask = outer & ~inner
+    if lower_half:
+        mask &= yy >= cy
+    return mask
+
+# Fake face vẽ sẵn thành mask (dùng khi dựng frame có mặt cho mỗi camera)
+FACE_MASK = (
+    _ellipse_masks(320, 240, 80, 80, thickness=2)                        # Face outline
+    | _ellipse_masks(290, 210, 15, 15)                                   # Eye
+    | _ellipse_masks(350, 210, 15, 15)                                   # Eye
+    | _ellipse_masks(320, 270, 40, 20, thickness=2, lower_half=True)     # Mouth
+)
+
+def new_frame_buffer(detector) -> np.ndarray:
+    """Buffer frame cấp phát một lần: 1 kênh cho Haar (bỏ cvtColor), BGR cho YuNet"""
+    if isinstance(detector, cv2.CascadeClassifier):
+        return np.empty((DETECT_SIZE[1], DETECT_SIZE[0]), dtype=np.uint8)
+    return np.empty((DETECT_SIZE[1], DETECT_SIZE[0], 3), dtype=np.uint8)
+
+def draw_test_frame(buf: np.ndarray, camera_id: str, has_face: bool) -> np.ndarray:
+    """Vẽ test frame (label CAM_<id>, fake face nếu has_face) vào buf tại chỗ và trả về buf"""
+    buf.fill(0)
+    # Label xanh lá (0, 255, 0) có độ sáng ~150 trên grayscale
+    label_color = 150 if buf.ndim == 2 else (0, 255, 0)
+    cv2.putText(buf, f"CAM_{camera_id}", (10, round(30 * DETECTION_SCALE)), cv2.FONT_HERSHEY_SIMPLEX,
+                DETECTION_SCALE, label_color, max(1, round(2 * DETECTION_SCALE)))
+    if has_face:
+        buf[FACE_MASK] = 255
+    return buf
+
+# Mọi mốc thời gian là perf_counter_ns (int, monotonic): không sai số float khi cộng dồn, không bị NTP chỉnh
+NS_PER_SEC = 1_000_000_000
+FRAME_INTERVAL_NS = NS_PER_SEC // 30  # 30 FPS
+
+# Kết quả từng camera dạng structured array: summary tính bằng numpy, không lặp Python
+RESULT_DTYPE = np.dtype([
+    ('fps', 'f8'), ('frames', 'i4'), ('det_ms', 'f8'), ('det_rate', 'f4'), ('duration', 'f4')
+])
+
+def summarize_results(results: List[Dict]) -> Dict:
+    """avg_fps / total_frames / avg_detection_time của danh sách kết quả camera"""
+    if not results:
+        return {"avg_fps": 0, "total_frames": 0, "avg_detection_time": 0}
+    
+    stats = np.fromiter(
+        ((r["fps"], r["frames_processed"], r["avg_detection_time_ms"], r["detection_rate"], r["duration"])
+         for r in results),
+        dtype=RESULT_DTYPE, count=len(results)
+    )
+    return {
+        "avg_fps": float(stats['fps'].mean()),
+        "total_frames": int(stats['frames'].sum()),
+        "avg_detection_time": float(stats['det_ms'].mean())
+    }
+
+def camera_rng(camera_id: str) -> np.random.Generator:
+    """Generator riêng của camera, seed từ camera_id (crc32 ổn định giữa các lần chạy, khác hash() của str)"""
+    return np.random.default_rng(zlib.crc32(camera_id.encode()))
+
+class CameraState:
+    """Trạng thái một camera (sequential loop hoặc scheduler của parallel test, một thread đọc/ghi)"""
+    __slots__ = ('camera_id', 'start_ns', 'end_ns', 'next_deadline_ns',
+                 'frames_processed', 'faces_detected', 'total_detection_ns', 'error', 'rng')
+    
+    def __init__(self, camera_id: str, start_ns: int):
+        self.camera_id = camera_id
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.next_deadline_ns = start_ns
+        self.frames_processed = 0
+        self.faces_detected = 0
+        self.total_detection_ns = 0
+        self.error = None
+        self.rng = camera_rng(camera_id)
+    
+    def record(self, face_count: int, detection_ns: int):
+        self.frames_processed += 1
+        self.total_detection_ns += detection_ns
+        if face_count > 0:
+            self.faces_detected += 1
+    
+    def to_result(self) -> Dict:
+        actual_duration = (self.end_ns - self.start_ns) / NS_PER_SEC
+        frames = self.frames_processed
+        return {
+            "camera_id": self.camera_id,
+            "duration": actual_duration,
+            "frames_processed": frames,
+            "faces_detected": self.faces_detected,
+            "fps": frames / actual_duration if actual_duration > 0 else 0,
+            "avg_detection_time_ms": self.total_detection_ns / frames / 1e6 if frames > 0 else 0,
+            "detection_rate": self.faces_detected / frames if frames > 0 else 0
+        }
 
 class SimpleCameraPerformanceTest:
-    def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    def __init__(self, backend: str = DETECTION_BACKEND):
+        # Detector cho sequential test; parallel test tạo detector trong từng worker process
+        self.detector = create_face_detector()
+        # 'cpu' giữ làm baseline; 'ocl' tự lùi về 'cpu' nếu máy không có OpenCL
+        self.backend = configure_backend(backend)
         self.results = []
-        
-    def generate_test_frame(self, camera_id: str) -> np.ndarray:
-        """Tạo test frame với fake face"""
-        frame = np.zeros((480, 640, 3), dtype=np.uint8)
-        
-        # 30% chance có face
-        if np.random.random() < 0.3:
-            # Vẽ fake face
-            cv2.circle(frame, (320, 240), 80, (255, 255, 255), 2)
-            cv2.circle(frame, (290, 210), 15, (255, 255, 255), -1)  # Eye
-            cv2.circle(frame, (350, 210), 15, (255, 255, 255), -1)  # Eye
-            cv2.ellipse(frame, (320, 270), (40, 20), 0, 0, 180, (255, 255, 255), 2)  # Mouth
-        
-        # Camera label
-        cv2.putText(frame, f"CAM_{camera_id}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        
-        return frame
+        # Buffer frame dùng lại cho mọi frame của sequential test (detection chỉ đọc frame)
+        self._frame_buf = new_frame_buffer(self.detector)
+    
+    @property
+    def detector_name(self) -> str:
+        return "Haar cascade" if isinstance(self.detector, cv2.CascadeClassifier) else "YuNet (DNN)"
+    
+    @staticmethod
+    def _has_face(rng: np.random.Generator) -> bool:
+        """30% chance có face"""
+        return rng.random() < 0.3
+    
+    def generate_test_frame(self, camera_id: str, buf: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Test frame với fake face (30%), vẽ vào buf (không cấp phát) - caller không được giữ frame qua lần gọi sau"""
+        return draw_test_frame(buf, camera_id, self._has_face(rng))
     
     def process_single_camera(self, camera_id: str, duration_seconds: int = 5) -> Dict:
         """Process single camera for testing"""
-        start_time = time.time()
-        frames_processed = 0
-        faces_detected = 0
-        total_detection_time = 0
+        now = time.perf_counter_ns()
+        camera = CameraState(camera_id, now)
+        end_ns = now + duration_seconds * NS_PER_SEC
         
         print(f"   🎥 Starting camera {camera_id}...")
         
-        while time.time() - start_time < duration_seconds:
+        while time.perf_counter_ns() < end_ns:
             # Generate frame
-            frame = self.generate_test_frame(camera_id)
+            frame = self.generate_test_frame(camera_id, self._frame_buf, camera.rng)
             
             # Face detection timing
-            detection_start = time.time()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-            detection_time = time.time() - detection_start
-            
-            total_detection_time += detection_time
-            frames_processed += 1
-            if len(faces) > 0:
-                faces_detected += 1
+            detection_start = time.perf_counter_ns()
+            face_count = detect_faces(self.detector, frame, self.backend == 'ocl')
+            camera.record(face_count, time.perf_counter_ns() - detection_start)
             
-            # Simulate 30 FPS
-            time.sleep(1/30)
+            # 30 FPS theo deadline tuyệt đối: không cộng dồn sai số của sleep, không sleep khi đã trễ
+            camera.next_deadline_ns += FRAME_INTERVAL_NS
+            delay_ns = camera.next_deadline_ns - time.perf_counter_ns()
+            if delay_ns > 0:
+                time.sleep(delay_ns / NS_PER_SEC)
         
-        actual_duration = time.time() - start_time
-        
-        result = {
-            "camera_id": camera_id,
-            "duration": actual_duration,
-            "frames_processed": frames_processed,
-            "faces_detected": faces_detected,
-            "fps": frames_processed / actual_duration,
-            "avg_detection_time_ms": (total_detection_time / frames_processed) * 1000 if frames_processed > 0 else 0,
-            "detection_rate": faces_detected / frames_processed if frames_processed > 0 else 0
-        }
+        camera.end_ns = time.perf_counter_ns()
+        result = camera.to_result()
         
         print(f"   ✅ Camera {camera_id}: {result['fps']:.1f} FPS, {result['avg_detection_time_ms']:.1f}ms/detection")
         return result
@@ -79,77 +277,110 @@ class SimpleCameraPerformanceTest:
         """Test cameras sequentially"""
         print(f"\n📹 Testing {camera_count} cameras SEQUENTIALLY...")
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         results = []
         
         for i in range(camera_count):
             result = self.process_single_camera(f"seq_{i}", duration)
             results.append(result)
         
-        total_time = time.time() - start_time
+        total_time = (time.perf_counter_ns() - start_ns) / NS_PER_SEC
         
         summary = {
             "method": "sequential",
             "camera_count": camera_count,
             "total_time": total_time,
-            "avg_fps": sum(r["fps"] for r in results) / len(results),
-            "total_frames": sum(r["frames_processed"] for r in results),
-            "avg_detection_time": sum(r["avg_detection_time_ms"] for r in results) / len(results),
+            **summarize_results(results),
             "results": results
         }
         
         print(f"   📊 Sequential Summary: {summary['avg_fps']:.1f} avg FPS, {summary['total_time']:.1f}s total")
         return summary
     
-    def test_parallel_cameras(self, camera_count: int, duration: int = 5, max_workers: int = 4) -> Dict:
-        """Test cameras in parallel"""
+    def test_parallel_cameras(self, camera_count: int, duration: int = 5, max_workers: int = MAX_WORKERS,
+                              pool: Optional[ProcessPoolExecutor] = None) -> Dict:
+        """Test cameras in parallel
+        
+        Một scheduler (thread hiện tại) giữ trạng thái + nhịp 30 FPS của mọi camera;
+        process pool nhận batch camera, vẽ frame vào buffer riêng rồi detect, mỗi worker process có detector và GIL riêng.
+        pool: pool dùng chung giữa các cấu hình (caller đóng); None thì tạo pool riêng cho lần test này.
+        """
         print(f"\n🎬 Testing {camera_count} cameras PARALLEL ({max_workers} workers)...")
         
-        start_time = time.time()
-        results = []
+        start_ns = time.perf_counter_ns()
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            futures = {
-                executor.submit(self.process_single_camera, f"par_{i}", duration): i 
-                for i in range(camera_count)
-            }
+        with nullcontext(pool) if pool is not None else create_detection_pool(max_workers, self.backend) as executor:
+            now = time.perf_counter_ns()
+            end_ns = now + duration * NS_PER_SEC
+            cameras = [CameraState(f"par_{i}", now) for i in range(camera_count)]
+            ready = [(now, i) for i in range(camera_count)]  # heap (deadline, camera index)
+            heapq.heapify(ready)
+            in_flight = {}  # future -> list camera index của batch
             
-            # Collect results
-            for future in as_completed(futures):
-                try:
-                    result = future.result(timeout=duration + 5)
-                    results.append(result)
-                except Exception as e:
-                    camera_id = futures[future]
-                    print(f"   ❌ Camera par_{camera_id} failed: {e}")
+            while ready or in_flight:
+                # Đợi detection xong hoặc tới deadline gần nhất
+                timeout = max(0, ready[0][0] - time.perf_counter_ns()) / NS_PER_SEC if ready else None
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    time.sleep(timeout)
+                
+                now = time.perf_counter_ns()
+                for future in done:
+                    indices = in_flight.pop(future)
+                    try:
+                        batch_results = future.result()
+                    except Exception as e:
+                        for index in indices:
+                            cameras[index].error = e
+                            cameras[index].end_ns = now
+                        continue
+                    
+                    for index, (face_count, detection_ns) in zip(indices, batch_results):
+                        camera = cameras[index]
+                        camera.record(face_count, detection_ns)
+                        camera.next_deadline_ns += FRAME_INTERVAL_NS
+                        if camera.next_deadline_ns < end_ns:
+                            heapq.heappush(ready, (camera.next_deadline_ns, index))
+                        else:
+                            camera.end_ns = now
+                
+                # Dispatch khi có camera tới deadline, kèm các camera tới hạn trong BATCH_WINDOW_NS tiếp theo
+                if ready and ready[0][0] <= now:
+                    horizon = now + BATCH_WINDOW_NS
+                    due = []
+                    while ready and ready[0][0] <= horizon:
+                        due.append(heapq.heappop(ready)[1])
+                    
+                    # Chia đều cho các worker (batch không lớn hơn mức cần để mọi worker đều có việc)
+                    batch_size = max(1, min(DETECTION_BATCH, -(-len(due) // max_workers)))
+                    for k in range(0, len(due), batch_size):
+                        indices = due[k:k + batch_size]
+                        # Worker tự vẽ frame vào buffer của nó; chỉ gửi camera_id + cờ có mặt
+                        items = [(cameras[i].camera_id, self._has_face(cameras[i].rng)) for i in indices]
+                        in_flight[executor.submit(_timed_detect_batch, items)] = indices
         
-        total_time = time.time() - start_time
+        results = []
+        for camera in cameras:
+            if camera.error is not None:
+                print(f"   ❌ Camera {camera.camera_id} failed: {camera.error}")
+                continue
+            result = camera.to_result()
+            print(f"   ✅ Camera {camera.camera_id}: {result['fps']:.1f} FPS, {result['avg_detection_time_ms']:.1f}ms/detection")
+            results.append(result)
         
-        if results:
-            summary = {
-                "method": "parallel",
-                "camera_count": camera_count,
-                "successful_cameras": len(results),
-                "max_workers": max_workers,
-                "total_time": total_time,
-                "avg_fps": sum(r["fps"] for r in results) / len(results),
-                "total_frames": sum(r["frames_processed"] for r in results),
-                "avg_detection_time": sum(r["avg_detection_time_ms"] for r in results) / len(results),
-                "results": results
-            }
-        else:
-            summary = {
-                "method": "parallel",
-                "camera_count": camera_count,
-                "successful_cameras": 0,
-                "max_workers": max_workers,
-                "total_time": total_time,
-                "avg_fps": 0,
-                "total_frames": 0,
-                "avg_detection_time": 0,
-                "results": []
-            }
+        total_time = (time.perf_counter_ns() - start_ns) / NS_PER_SEC
+        
+        summary = {
+            "method": "parallel",
+            "camera_count": camera_count,
+            "successful_cameras": len(results),
+            "max_workers": max_workers,
+            "total_time": total_time,
+            **summarize_results(results),
+            "results": results
+        }
         
         success_rate = summary['successful_cameras'] / camera_count * 100
         print(f"   📊 Parallel Summary: {summary['successful_cameras']}/{camera_count} cameras ({success_rate:.1f}% success)")
@@ -163,6 +394,9 @@ class SimpleCameraPerformanceTest:
         print("="*50)
         print("Testing face detection performance với nhiều camera")
         print(f"OpenCV version: {cv2.__version__}")
+        print(f"Face detector: {self.detector_name}")
+        print(f"Backend: {self.backend}")
+        print(f"Detection resolution: {DETECT_SIZE[0]}x{DETECT_SIZE[1]} (scale {DETECTION_SCALE})")
         
         # Test configurations
         test_configs = [1, 5, 10, 15, 20, 25]
@@ -174,42 +408,46 @@ class SimpleCameraPerformanceTest:
         
         parallel_results = []
         
-        for camera_count in test_configs:
-            print(f"\n" + "-"*30)
-            print(f"🎯 Testing {camera_count} cameras...")
+        # Một pool cho mọi cấu hình: không fork/spawn + load detector lại mỗi lần đổi số camera
+        with create_detection_pool(MAX_WORKERS, self.backend) as pool:
+            warm_up_pool(pool, MAX_WORKERS)
             
-            try:
-                # Test parallel (main method)
-                parallel_summary = self.test_parallel_cameras(camera_count, duration, max_workers=4)
-                parallel_results.append(parallel_summary)
-                
-                # Performance analysis
-                success_rate = parallel_summary['successful_cameras'] / camera_count
-                avg_fps = parallel_summary['avg_fps']
-                avg_detection = parallel_summary['avg_detection_time']
-                
-                print(f"   📈 Results:")
-                print(f"      Success: {success_rate*100:.1f}% ({parallel_summary['successful_cameras']}/{camera_count})")
-                print(f"      FPS per camera: {avg_fps:.1f}")
-                print(f"      Detection time: {avg_detection:.1f}ms")
+            for camera_count in test_configs:
+                print(f"\n" + "-"*30)
+                print(f"🎯 Testing {camera_count} cameras...")
                 
-                # Check if performance is degrading
-                if success_rate < 0.8:
-                    print(f"   ⚠️  Success rate dropped below 80%!")
-                    print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
-                    break
-                elif avg_fps < 15:
-                    print(f"   ⚠️  FPS dropped below 15!")
-                    print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
-                    break
-                elif avg_detection > 100:  # 100ms is quite slow
-                    print(f"   ⚠️  Detection time too slow (>100ms)!")
-                    print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
-                    break
+                try:
+                    # Test parallel (main method)
+                    parallel_summary = self.test_parallel_cameras(camera_count, duration, max_workers=MAX_WORKERS, pool=pool)
+                    parallel_results.append(parallel_summary)
                     
-            except Exception as e:
-                print(f"   ❌ Test failed: {e}")
-                break
+                    # Performance analysis
+                    success_rate = parallel_summary['successful_cameras'] / camera_count
+                    avg_fps = parallel_summary['avg_fps']
+                    avg_detection = parallel_summary['avg_detection_time']
+                    
+                    print(f"   📈 Results:")
+                    print(f"      Success: {success_rate*100:.1f}% ({parallel_summary['successful_cameras']}/{camera_count})")
+                    print(f"      FPS per camera: {avg_fps:.1f}")
+                    print(f"      Detection time: {avg_detection:.1f}ms")
+                    
+                    # Check if performance is degrading
+                    if success_rate < 0.8:
+                        print(f"   ⚠️  Success rate dropped below 80%!")
+                        print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
+                        break
+                    elif avg_fps < 15:
+                        print(f"   ⚠️  FPS dropped below 15!")
+                        print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
+                        break
+                    elif avg_detection > 100:  # 100ms is quite slow
+                        print(f"   ⚠️  Detection time too slow (>100ms)!")
+                        print(f"   📊 Recommended limit: {max(1, camera_count-5)} cameras")
+                        break
+                        
+                except Exception as e:
+                    print(f"   ❌ Test failed: {e}")
+                    break
         
         # Final analysis
         self.print_final_analysis(parallel_results)
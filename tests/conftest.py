@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Cấu hình phải có trước khi import app (app được dựng ở module level)
+os.environ.setdefault('FLASK_CONFIG', 'testing')
+os.environ.setdefault('CAMERAS_JSON_FILE', os.path.join(os.path.dirname(__file__), 'no_cameras.json'))
+os.environ.setdefault('DB_POOL_PREWARM', 'False')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def flask_app():
+    import app as app_module
+    return app_module.app
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
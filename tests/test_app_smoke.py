@@ -0,0 +1,18 @@
+import importlib
+
+def test_middleware_imports():
+    middleware = importlib.import_module('middleware')
+    assert middleware.OrjsonProvider.option
+
+def test_app_imports(flask_app):
+    assert flask_app.json.__class__.__name__ == 'OrjsonProvider'
+
+def test_json_provider_roundtrip(flask_app):
+    data = {1: 'a', 'b': [1, 2]}
+    assert flask_app.json.loads(flask_app.json.dumps(data)) == {'1': 'a', 'b': [1, 2]}
+
+def test_cameras_endpoint_returns_json(client):
+    response = client.get('/api/cameras')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert response.get_json()['status'] == 'success'
@@ -0,0 +1,40 @@
+import io
+import logging
+import queue
+
+from logger_config import BatchQueueListener
+
+class _FailingFlushHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+    
+    def flush(self):
+        raise ValueError("I/O operation on closed file.")
+
+def test_listener_survives_flush_errors(monkeypatch):
+    monkeypatch.setattr(logging, 'raiseExceptions', False)
+    log_queue = queue.SimpleQueue()
+    handler = _FailingFlushHandler()
+    listener = BatchQueueListener(log_queue, handler)
+    listener.start()
+    
+    for i in range(3):
+        log_queue.put(logging.makeLogRecord({'msg': f'record {i}'}))
+    
+    listener.stop()
+    assert [r.msg for r in handler.records] == ['record 0', 'record 1', 'record 2']
+
+def test_listener_skips_closed_streams():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    stream.close()
+    
+    log_queue = queue.SimpleQueue()
+    listener = BatchQueueListener(log_queue, handler)
+    listener.start()
+    listener.stop()
+    assert listener._thread is None
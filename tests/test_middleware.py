@@ -0,0 +1,43 @@
+import orjson
+
+import middleware
+
+def test_pagination_error_bodies_prebuilt():
+    assert orjson.loads(middleware._BAD_PAGE_BODY) == {"error": "Page phải >= 1"}
+    assert orjson.loads(middleware._BAD_PER_PAGE_BODY) == {"error": "Per_page phải từ 1-100"}
+
+def test_invalid_page_rejected(client):
+    response = client.get('/api/detection-results?page=0')
+    assert response.status_code == 400
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {"error": "Page phải >= 1"}
+
+def test_invalid_per_page_rejected(client):
+    response = client.get('/api/detection-results?per_page=500')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Per_page phải từ 1-100"}
+
+def test_etag_roundtrip_returns_304(client):
+    first = client.get('/api/cameras')
+    assert first.status_code == 200
+    etag, weak = first.get_etag()
+    assert etag and weak
+    
+    # Envelope (timestamp/request_id) đổi mỗi request nhưng ETag theo payload thì không
+    second = client.get('/api/cameras')
+    assert second.get_etag() == (etag, weak)
+    
+    cached = client.get('/api/cameras', headers={'If-None-Match': f'W/"{etag}"'})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+def test_etag_mismatch_returns_full_response(client):
+    response = client.get('/api/cameras', headers={'If-None-Match': 'W/"stale"'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+
+def test_api_response_envelope_keeps_volatile_fields(client):
+    body = client.get('/api/cameras').get_json()
+    assert body['status'] == 'success'
+    assert isinstance(body['timestamp'], float)
+    assert body['request_id'] != 'unknown'
@@ -0,0 +1,94 @@
+import numpy as np
+
+import services
+
+def test_image_write_future_completes_per_item(tmp_path):
+    paths = [tmp_path / f"cam_{i}.jpg" for i in range(3)]
+    futures = [services._enqueue_image_write(np.zeros((8, 8, 3), np.uint8), str(p)) for p in paths]
+    
+    assert [f.result(timeout=5) for f in futures] == [True, True, True]
+    assert all(p.exists() for p in paths)
+
+def test_image_write_future_reports_failure(tmp_path):
+    missing_dir = tmp_path / "missing" / "cam.jpg"
+    future = services._enqueue_image_write(np.zeros((8, 8, 3), np.uint8), str(missing_dir))
+    assert future.result(timeout=5) is False
+
+def test_delete_camera_removes_children(flask_app):
+    from models import db, Camera, Detection, StreamSession
+    
+    with flask_app.app_context():
+        db.session.add(Camera(id='cam_del', name='Del', ip='10.9.9.9', location='Lab'))
+        db.session.flush()
+        db.session.add(Detection(camera_id='cam_del', timestamp=1700000000, image_path='/x.jpg', faces_count=1))
+        db.session.add(StreamSession(camera_id='cam_del', session_id='s1'))
+        db.session.commit()
+        
+        ok, _ = services.CameraService.delete_camera('cam_del')
+        
+        assert ok
+        assert db.session.get(Camera, 'cam_del') is None
+        assert Detection.query.filter_by(camera_id='cam_del').count() == 0
+        assert StreamSession.query.filter_by(camera_id='cam_del').count() == 0
+
+def test_delete_missing_camera(flask_app):
+    with flask_app.app_context():
+        ok, message = services.CameraService.delete_camera('cam_missing')
+        assert not ok
+        assert message == "Camera không tồn tại"
+
+def test_failed_stream_start_releases_slot(flask_app, monkeypatch):
+    from models import db, Camera
+    
+    with flask_app.app_context():
+        db.session.add(Camera(id='cam_stream', name='Stream', ip='10.9.9.12', location='Lab'))
+        db.session.commit()
+        
+        def failing_commit():
+            raise RuntimeError("commit failed")
+        monkeypatch.setattr(db.session, 'commit', failing_commit)
+        
+        ok, _ = services.StreamService.start_camera_stream('cam_stream')
+        
+        assert not ok
+        assert 'cam_stream' not in services.StreamService.get_active_streams()
+
+def test_sync_active_streams_from_sessions(flask_app):
+    from models import db, Camera, StreamSession
+    
+    with flask_app.app_context():
+        db.session.add(Camera(id='cam_live', name='Live', ip='10.9.9.10', location='Lab'))
+        db.session.add(Camera(id='cam_old', name='Old', ip='10.9.9.11', location='Lab'))
+        db.session.flush()
+        db.session.add(StreamSession(camera_id='cam_live', session_id='s-active', status='active'))
+        db.session.add(StreamSession(camera_id='cam_old', session_id='s-stopped', status='stopped'))
+        db.session.commit()
+        services.StreamService.active_streams = {'cam_stale'}
+        
+        assert services.StreamService.sync_active_streams() == ['cam_live']
+        assert services.StreamService.get_active_streams() == ['cam_live']
+
+def test_frame_template_dropped_on_camera_update(flask_app):
+    from models import db, Camera
+    
+    with flask_app.app_context():
+        db.session.add(Camera(id='cam_tpl', name='Before', ip='10.9.9.13', location='Lab'))
+        db.session.commit()
+        
+        detector = services.AsyncFaceDetectionService(max_workers=1)
+        detector._get_frame_template('cam_tpl', {'name': 'Before', 'ip': '10.9.9.13', 'location': 'Lab'})
+        assert 'cam_tpl' in services._frame_templates
+        
+        ok, _, _ = services.CameraService.update_camera('cam_tpl', {'name': 'After'})
+        assert ok
+        assert 'cam_tpl' not in services._frame_templates
+
+def test_frame_template_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(services, 'FRAME_TEMPLATE_CACHE_SIZE', 2)
+    detector = services.AsyncFaceDetectionService(max_workers=1)
+    camera = {'name': 'Cam', 'ip': '10.0.0.1', 'location': 'Lab'}
+    for camera_id in ('lru_a', 'lru_b', 'lru_c'):
+        detector._get_frame_template(camera_id, camera)
+    
+    assert 'lru_a' not in services._frame_templates
+    assert len(services._frame_templates) <= 2